@@ -0,0 +1,16 @@
+from conformance import fitness_alignments, read_from_file, alpha, Aligner
+
+log = read_from_file("extension-log.xes")
+log_noisy = read_from_file("extension-log-noisy.xes")
+
+mined_model = alpha(log)
+print(round(fitness_alignments(log, mined_model), 5))
+print(round(fitness_alignments(log_noisy, mined_model), 5))
+
+# the moves of one noisy trace, >> marks a log or model move
+aligner = Aligner(mined_model)
+trace = [event.get_task() for event in log_noisy["case_880"]]
+alignment = aligner.align(trace)
+print(alignment.get_cost(), alignment.is_optimal())
+for move in alignment.get_moves():
+    print(move)
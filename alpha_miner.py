@@ -1,34 +1,143 @@
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import uuid
-from itertools import chain, combinations
-
-def alpha(log):
+import hashlib
+import json
+import os
+from array import array
+from collections import Counter
+from itertools import accumulate, repeat
+from operator import add, mul
+
+# NumPy is optional: with it directly_follows_matrix returns an n x n int64 ndarray,
+# without it a list of array('q') rows, and both are read as matrix[a][b]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def alpha(log, cache_dir=None):
     wf_net = WorkflowNet(log)
     wf_net.omit_duplicate_traces()
     wf_net.init_transition_sets()
     wf_net.get_ordering_relations()
+
+    # the places only depend on the footprint, so a net mined from the same footprint can be reused
+    # a missing, unreadable or damaged cache entry is just a miss
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'alpha-%d-%s.net' % (ALPHA_CACHE_VERSION, wf_net.get_footprint_digest()))
+        try:
+            return PetriNet.load(path)
+        except (OSError, ValueError):
+            pass
+
     wf_net.init_places()
     wf_net.init_flow_relations()
     wf_net.build_petri_net()
-    
+
+    # the cache only saves work, failing to write it must not fail the mining
+    if cache_dir is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            wf_net.get_petri_net().save(path)
+        except OSError:
+            pass
+
     return wf_net.get_petri_net()
 
+class IncrementalAlpha():
+    def __init__(self):
+        self._activities = set()
+        self._initial = set()
+        self._final = set()
+        self._direct_successions = set()
+        self._causals = set()
+        self._wf_net = None
+
+    def add_trace(self, events):
+        tasks = [event.get_task() for event in events]
+        if len(tasks) <= 0:
+            return
+
+        if not self._activities.issuperset(tasks):
+            self._activities.update(tasks)
+            self._wf_net = None
+
+        if tasks[0] not in self._initial:
+            self._initial.add(tasks[0])
+            self._wf_net = None
+
+        if tasks[-1] not in self._final:
+            self._final.add(tasks[-1])
+            self._wf_net = None
+
+        for succession in zip(tasks, tasks[1:]):
+            if succession in self._direct_successions:
+                continue
+
+            # a new succession either adds a causal or turns an existing one into a parallel
+            self._direct_successions.add(succession)
+            reverse = (succession[1], succession[0])
+            if reverse in self._direct_successions:
+                self._causals.discard(reverse)
+            else:
+                self._causals.add(succession)
+            self._wf_net = None
+
+    def current_net(self):
+        if self._wf_net is None:
+            # same dense ids as init_transition_sets, so the net equals alpha() on the same traces
+            transitions = {name: Transition(name, -(i + 1)) for i, name in enumerate(sorted(self._activities))}
+            wf_net = WorkflowNet.from_footprint(
+                transitions.values(),
+                [transitions[name] for name in self._initial],
+                [transitions[name] for name in self._final],
+                [(transitions[a], transitions[b]) for a, b in self._direct_successions],
+                [(transitions[a], transitions[b]) for a, b in self._causals])
+            wf_net.init_places()
+            wf_net.init_flow_relations()
+            self._wf_net = wf_net
+
+        # places hold the marking, so every caller gets its own copies like a fresh alpha() net
+        places = [Place(place.get_id(), place.get_tokens(), place.get_A(), place.get_B()) for place in self._wf_net.P_W]
+        return PetriNet(places, self._wf_net.T_W, self._wf_net.F_W)
+
 class WorkflowNet():
     def __init__(self, log):
         self._log = log
         self.T_W = set()
         self.T_I = set()
         self.T_O = set()
-        self.X_W = set()
         self.Y_W = set()
         self.P_W = set()
         self.F_W = set()
         self._direct_successions = set()
-        self._choices = set()
         self._causals = set()
+        self._footprint = None
+        self._choice_neighbours = []
+        self._causal_successors = []
         self._petri_net = None
     
+    @classmethod
+    def from_footprint(cls, T_W, T_I, T_O, direct_successions, causals):
+        wf_net = cls(dict())
+        wf_net.T_W = set(T_W)
+        wf_net.T_I = set(T_I)
+        wf_net.T_O = set(T_O)
+        wf_net._direct_successions = set(direct_successions)
+        wf_net._causals = set(causals)
+        wf_net._footprint = Footprint(wf_net.T_W, wf_net._direct_successions)
+        return wf_net
+
+    def get_footprint_digest(self):
+        footprint = {
+            'T_W': sorted(self._names(self.T_W)),
+            'T_I': sorted(self._names(self.T_I)),
+            'T_O': sorted(self._names(self.T_O)),
+            'successions': sorted(self._names(succession) for succession in self._direct_successions),
+        }
+        return hashlib.sha256(json.dumps(footprint).encode('utf-8')).hexdigest()
+
     def omit_duplicate_traces(self):
         hashset = set()
         new_log = dict()
@@ -48,8 +157,8 @@ class WorkflowNet():
     
     def get_ordering_relations(self):
         self._get_direct_successions()
-        self._get_choices()
         self._get_causals()
+        self._footprint = Footprint(self.T_W, self._direct_successions)
 
     def init_transition_sets(self):
         all_events = set()
@@ -60,7 +169,9 @@ class WorkflowNet():
             end_events.add(events[-1])
             all_events = all_events.union(set(event for event in events))
         
-        self.T_W = self.T_W.union(set([Transition.from_event(event) for event in all_events]))
+        # transitions get dense negative ids in alphabet order, place ids stay non-negative
+        ordered_events = sorted(all_events, key=lambda event: event.get_task())
+        self.T_W = self.T_W.union(set([Transition.from_event(event, -(i + 1)) for i, event in enumerate(ordered_events)]))
 
         for T in self.T_W:
             for initial in initial_events:
@@ -75,22 +186,20 @@ class WorkflowNet():
         if len(self.T_W) <= 0:
             return
         
-        T_W_subsets = self._get_all_nonempty_subsets(self.T_W)
+        # only transitions without a self loop can be part of A or B
+        n = len(self._footprint)
+        candidates = 0
+        for i in range(n):
+            if self._footprint.choice(i) >> i & 1:
+                candidates |= 1 << i
 
-        for A in T_W_subsets:
-            for B in T_W_subsets:
-                if self._are_X_W_elements(A, B):
-                    self.X_W.add((A, B))
-        
-        self.Y_W = self.X_W.copy()
-        for A, B in self.X_W:
-            for A_prime, B_prime in self.X_W:
-                if (A, B) != (A_prime, B_prime) and set(A).issubset(A_prime) and set(B).issubset(B_prime):
-                    self.Y_W.discard((A, B))
+        self._choice_neighbours = [self._footprint.choice(i) & candidates & ~(1 << i) for i in range(n)]
+        self._causal_successors = [self._footprint.causal(i) & candidates for i in range(n)]
+        self._grow_A(0, candidates, candidates)
 
         self.P_W.add(Place(0, 1, None, self.T_I))
         i = 1
-        for A, B in self.Y_W:
+        for A, B in sorted(self.Y_W, key=lambda place: (self._names(place[0]), self._names(place[1]))):
             self.P_W.add(Place(i, 0, A, B))
             i+=1
         self.P_W.add(Place(i, 0, self.T_O, None))
@@ -112,19 +221,16 @@ class WorkflowNet():
     def get_petri_net(self):
         return self._petri_net
 
-    def _get_all_nonempty_subsets(self, iterable):
-        s = list(iterable)
-        return list(chain.from_iterable(combinations(s, r) for r in range(1, len(s)+1)))
+    def _names(self, transitions):
+        return [t.get_name() for t in transitions]
 
     def _get_direct_successions(self):
+        # Don't want to recreate transition so, we find it within the existing ones
+        transitions = {t.get_name(): t for t in self.T_W}
         for events in self._log.values():
             prev_transition = None
             for event in events:
-                transition = None
-                # Don't want to recreate transition so, we find it within the existing ones
-                for t in self.T_W:
-                    if t.get_name() == event.get_task():
-                        transition = t
+                transition = transitions.get(event.get_task())
 
                 if prev_transition is not None:
                     self._direct_successions.add((prev_transition, transition))
@@ -136,58 +242,233 @@ class WorkflowNet():
             if (succession[1], succession[0]) not in self._direct_successions:
                 self._causals.add(succession)
 
-    def _get_choices(self):
-        for outer_transition in self.T_W:
-            for inner_transition in self.T_W:
-                left_right_relation = (outer_transition, inner_transition)
-                right_left_relation = (inner_transition, outer_transition)
+    def _grow_A(self, A, candidates, successors):
+        # all masks: candidates are in # with every element of A, successors are caused by every element of A
+        while candidates:
+            a = lowest_bit(candidates)
+            candidates &= candidates - 1
 
-                if left_right_relation in self._direct_successions or right_left_relation in self._direct_successions:
-                    continue
-                
-                self._choices.add(left_right_relation)
+            A_successors = successors & self._causal_successors[a]
+            if A_successors == 0:
+                continue
 
-    def _are_X_W_elements(self, A, B):
-        if len(A) <= 0:
-            return False
+            new_A = A | (1 << a)
+            for B in self._maximal_B(0, A_successors, 0):
+                if self._is_maximal_A(new_A, B):
+                    self.Y_W.add((self._footprint.members(new_A), self._footprint.members(B)))
+
+            self._grow_A(new_A, candidates & self._choice_neighbours[a], A_successors)
+
+    def _maximal_B(self, B, candidates, excluded):
+        # Bron-Kerbosch enumeration of the maximal #-cliques among the candidates
+        if candidates == 0 and excluded == 0:
+            yield B
+            return
+
+        while candidates:
+            b = lowest_bit(candidates)
+            neighbours = self._choice_neighbours[b]
+            yield from self._maximal_B(B | (1 << b), candidates & neighbours, excluded & neighbours)
+            candidates &= ~(1 << b)
+            excluded |= 1 << b
+
+    def _is_maximal_A(self, A, B):
+        # a transition in # with all of A that causes all of B would extend the pair
+        extensions = self._choice_neighbours[lowest_bit(A)] & ~A
+        rest = A
+        while rest:
+            extensions &= self._choice_neighbours[lowest_bit(rest)]
+            rest &= rest - 1
+
+        while extensions:
+            if self._causal_successors[lowest_bit(extensions)] & B == B:
+                return False
+            extensions &= extensions - 1
 
-        if len(B) <= 0:
-            return False
-        
-        for a_1 in A:
-            for a_2 in A:
-                if (a_1, a_2) not in self._choices:
-                    return False
-            
-            for b in B:
-                if (a_1, b) not in self._causals:
-                    return False
-
-        for b_1 in B:
-            for b_2 in B:
-                if (b_1, b_2) not in self._choices:
-                    return False
-        
         return True
 
+class Footprint():
+    def __init__(self, transitions, direct_successions):
+        self._transitions = sorted(transitions, key=lambda t: t.get_name())
+        self._index = {t: i for i, t in enumerate(self._transitions)}
+        self._all = (1 << len(self._transitions)) - 1
+
+        # bit j of follows[i] is set when t_i is directly followed by t_j
+        self._follows = [0] * len(self._transitions)
+        self._precedes = [0] * len(self._transitions)
+        for source, target in direct_successions:
+            i = self._index[source]
+            j = self._index[target]
+            self._follows[i] |= 1 << j
+            self._precedes[j] |= 1 << i
+
+    def index(self, transition):
+        return self._index[transition]
+
+    def members(self, mask):
+        members = []
+        while mask:
+            members.append(self._transitions[lowest_bit(mask)])
+            mask &= mask - 1
+
+        return tuple(members)
+
+    def causal(self, i):
+        return self._follows[i] & ~self._precedes[i]
+
+    def inverse_causal(self, i):
+        return self._precedes[i] & ~self._follows[i]
+
+    def choice(self, i):
+        return self._all & ~(self._follows[i] | self._precedes[i])
+
+    def parallel(self, i):
+        return self._follows[i] & self._precedes[i]
+
+    def __len__(self):
+        return len(self._transitions)
+
+def lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
 class PetriNet():
     def __init__(self, places=None, transitions=None, edges=None):
-        self._places = set() if places is None else places
-        self._transitions = set() if transitions is None else transitions
-        self._edges = set() if edges is None else edges
+        self._places = set()
+        self._transitions = set()
+        self._edges = set()
+        self._places_by_id = dict()
+        self._transitions_by_name = dict()
+        self._preset = dict()
+        self._postset = dict()
+
+        for place in [] if places is None else places:
+            self._index_place(place)
+        for transition in [] if transitions is None else transitions:
+            self._index_transition(transition)
+        for edge in [] if edges is None else edges:
+            self._index_edge(edge)
 
     def add_place(self, name):
-        self._places.add(Place(name))
+        self._index_place(Place(name))
         return self
 
     def add_transition(self, name, id):
-        self._transitions.add(Transition(name, id))
+        self._index_transition(Transition(name, id))
         return self
 
     def add_edge(self, source, target):
-        self._edges.add(Edge(source, target))
+        self._index_edge(Edge(source, target))
         return self
 
+    def save(self, path):
+        places = list(self._places_by_id.values())
+        place_index = {place.get_id(): i for i, place in enumerate(places)}
+        transitions = sorted(self._transitions, key=lambda t: t.get_id())
+
+        # compressed sparse rows: the arcs of transition t are preset[preset_offsets[t]:preset_offsets[t + 1]]
+        preset_offsets = array('q', [0])
+        preset = array('i')
+        postset_offsets = array('q', [0])
+        postset = array('i')
+        for transition in transitions:
+            preset.extend(place_index[id] for id in self._preset.get(transition.get_id(), []) if id in place_index)
+            preset_offsets.append(len(preset))
+            postset.extend(place_index[id] for id in self._postset.get(transition.get_id(), []) if id in place_index)
+            postset_offsets.append(len(postset))
+
+        columns = [
+            array('q', [place.get_id() for place in places]),
+            array('q', [place.get_tokens() for place in places]),
+            array('q', [transition.get_id() for transition in transitions]),
+            preset_offsets,
+            preset,
+            postset_offsets,
+            postset,
+        ]
+        header = json.dumps({
+            'names': [transition.get_name() for transition in transitions],
+            'lengths': [len(column) for column in columns],
+        }).encode('utf-8')
+
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(NET_MAGIC)
+                f.write(len(header).to_bytes(8, 'little'))
+                f.write(header)
+                for column in columns:
+                    f.write(column.tobytes())
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if data[:8] != NET_MAGIC:
+            raise ValueError('%s is not a saved PetriNet' % path)
+
+        try:
+            header_end = 16 + int.from_bytes(data[8:16], 'little')
+            if header_end > len(data):
+                raise ValueError('header runs past the end of the file')
+            header = json.loads(data[16:header_end].decode('utf-8'))
+            if len(header['lengths']) != 7:
+                raise ValueError('expected 7 columns')
+
+            columns = []
+            start = header_end
+            for typecode, length in zip('qqqqiqi', header['lengths']):
+                column = array(typecode)
+                end = start + length * column.itemsize
+                if length < 0 or end > len(data):
+                    raise ValueError('column runs past the end of the file')
+                column.frombytes(data[start:end])
+                columns.append(column)
+                start = end
+            if start != len(data):
+                raise ValueError('trailing bytes after the last column')
+            place_ids, tokens, transition_ids, preset_offsets, preset, postset_offsets, postset = columns
+
+            # the CSR arrays have to describe exactly the places and transitions in the file
+            if len(tokens) != len(place_ids) or len(header['names']) != len(transition_ids):
+                raise ValueError('column lengths do not match')
+            for offsets, indices in ((preset_offsets, preset), (postset_offsets, postset)):
+                if len(offsets) != len(transition_ids) + 1 or offsets[0] != 0 or offsets[-1] != len(indices):
+                    raise ValueError('arc offsets do not match')
+                if any(a > b for a, b in zip(offsets, offsets[1:])) or any(i < 0 or i >= len(place_ids) for i in indices):
+                    raise ValueError('arcs point outside the net')
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError('%s is a damaged PetriNet file: %s' % (path, e))
+
+        # fill the indexes straight from the arrays instead of replaying add_place, add_transition and add_edge
+        net = cls()
+        for i, id in enumerate(place_ids):
+            place = Place(id, tokens[i])
+            net._places.add(place)
+            net._places_by_id[id] = place
+
+        for t, id in enumerate(transition_ids):
+            transition = Transition(header['names'][t], id)
+            net._transitions.add(transition)
+            net._transitions_by_name.setdefault(transition.get_name(), transition)
+
+            net._preset[id] = [place_ids[i] for i in preset[preset_offsets[t]:preset_offsets[t + 1]]]
+            for place_id in net._preset[id]:
+                net._postset.setdefault(place_id, []).append(id)
+                net._edges.add(Edge(place_id, id))
+
+            net._postset[id] = [place_ids[i] for i in postset[postset_offsets[t]:postset_offsets[t + 1]]]
+            for place_id in net._postset[id]:
+                net._preset.setdefault(place_id, []).append(id)
+                net._edges.add(Edge(id, place_id))
+
+        return net
+
     def get_tokens(self, id):
         return self._get_place_by_id(id).get_tokens()
 
@@ -201,9 +482,9 @@ class PetriNet():
         return True
 
     def add_marking(self, place_id):
-        for place in self._places:
-            if place.get_id() == place_id:
-                place.increment_tokens()
+        place = self._get_place_by_id(place_id)
+        if place is not None:
+            place.increment_tokens()
 
     def fire_transition(self, transition):
         if not self.is_enabled(transition):
@@ -219,36 +500,47 @@ class PetriNet():
             place.increment_tokens()
 
     def transition_name_to_id(self, name):
-        for transition in self._transitions:
-            if transition.get_name() == name:
-                return transition.get_id()
-        
-        return None
+        transition = self._transitions_by_name.get(name)
+        if transition is None:
+            return None
 
-    def _dot_t(self, t):
-        dot_t = set()
-        for edge in self._edges:
-            if edge.is_target(t):
-                place = self._get_place_by_id(edge.get_source())
-                dot_t.add(place)
+        return transition.get_id()
 
-        return dot_t
+    def _dot_t(self, t):
+        return set(self._get_place_by_id(id) for id in self._preset.get(t, []))
 
     def _t_dot(self, t):
-        t_dot = set()
-        for edge in self._edges:
-            if edge.is_source(t):
-                place = self._get_place_by_id(edge.get_target())
-                t_dot.add(place)
-
-        return t_dot
+        return set(self._get_place_by_id(id) for id in self._postset.get(t, []))
 
     def _get_place_by_id(self, id):
-        for place in self._places:
-            if place.get_id() == id:
-                return place
+        return self._places_by_id.get(id)
+
+    def _index_place(self, place):
+        if place.get_id() in self._places_by_id:
+            return
 
-        return None
+        self._places.add(place)
+        self._places_by_id[place.get_id()] = place
+
+    def _index_transition(self, transition):
+        if transition in self._transitions:
+            return
+
+        self._transitions.add(transition)
+        if transition.get_name() not in self._transitions_by_name:
+            self._transitions_by_name[transition.get_name()] = transition
+
+    def _index_edge(self, edge):
+        if edge in self._edges:
+            return
+
+        self._edges.add(edge)
+        self._postset.setdefault(edge.get_source(), []).append(edge.get_target())
+        self._preset.setdefault(edge.get_target(), []).append(edge.get_source())
+
+NET_MAGIC = b'PETRINET'
+# bump whenever a change to the place search gives a different net for the same footprint
+ALPHA_CACHE_VERSION = 1
 
 class Place():
     def __init__(self, id, num_of_tokens=0, A=None, B=None):
@@ -294,9 +586,9 @@ class Transition():
         self._id = id
 
     @classmethod
-    def from_event(cls, event):
+    def from_event(cls, event, id=None):
         name = event.get_task()
-        id = uuid.uuid4()
+        id = uuid.uuid4() if id is None else id
         return cls(name, id)
 
     def get_id(self):
@@ -310,7 +602,7 @@ class Transition():
 
     def __eq__(self, other):
         if isinstance(other, Transition):
-            return self._id == self._id
+            return self._id == other._id
 
 class Edge():
     def __init__(self, left, right):
@@ -337,21 +629,28 @@ class Edge():
             return self._source == other._source and self._target == other._target
 
 def read_from_file(path):
-    tree = ET.parse(path)
-    root = tree.getroot()
-
     cases = dict()
 
-    for trace in root:
-        if not trace.tag.endswith('trace'):
+    for case, events in stream_from_file(path):
+        if case not in cases.keys():
+            cases[case] = []
+        cases[case].extend(events)
+
+    return cases
+
+def stream_from_file(path):
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+
+    for action, trace in context:
+        if action != 'end' or not trace.tag.endswith('trace'):
             continue
 
         case = None
+        events = []
         for event in trace:
             if event.tag.endswith('string'):
                 case = event.get('value')
-                if case not in cases.keys():
-                    cases[case] = []
                 continue
 
             event_wrapper = Event(case)
@@ -368,11 +667,26 @@ def read_from_file(path):
                 else:
                     event_wrapper.add_resource(child.get('value'))
 
-            cases[case].append(event_wrapper)
+            events.append(event_wrapper)
 
-    return cases
+        yield case, events
+        # drop the consumed trace so only the one being read stays in memory
+        root.clear()
 
 def dependency_graph(log):
+    # columnar logs already hold their activity codes, a dict log is cheaper to count in one pass
+    if hasattr(log, 'encode'):
+        matrix, labels = dependency_matrix(log)
+
+        dg = dict()
+        for i, task in enumerate(labels):
+            dg[task] = dict()
+            for j, count in enumerate(matrix[i].tolist()):
+                if count > 0:
+                    dg[task][labels[j]] = count
+
+        return dg
+
     dg = dict()
     for _, events in log.items():
         prev_task = None
@@ -391,6 +705,48 @@ def dependency_graph(log):
 
     return dg
 
+def dependency_matrix(log):
+    codes, offsets, labels = encode_log(log)
+    return directly_follows_matrix(codes, offsets, len(labels)), labels
+
+def directly_follows_matrix(codes, offsets, n):
+    if np is not None:
+        codes = np.asarray(codes, dtype=np.int64)
+        keys = codes[:-1] * n + codes[1:]
+        # the pairs across a case boundary are not directly-follows pairs
+        boundaries = np.asarray(offsets, dtype=np.int64)[1:-1]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[boundaries[(boundaries > 0) & (boundaries < len(codes))] - 1] = False
+        return np.bincount(keys[keep], minlength=n * n).astype(np.int64).reshape(n, n)
+
+    # every pair of neighbouring codes is counted under the key prev * n + next
+    counts = Counter(map(add, map(mul, codes, repeat(n)), codes[1:]))
+    # the pairs across a case boundary are not directly-follows pairs
+    for boundary in set(offsets[1:-1]):
+        if 0 < boundary < len(codes):
+            counts[codes[boundary - 1] * n + codes[boundary]] -= 1
+
+    matrix = [array('q', bytes(8 * n)) for _ in range(n)]
+    for key, count in counts.items():
+        matrix[key // n][key % n] = count
+
+    return matrix
+
+def encode_log(log):
+    # columnar logs already hold their activity codes
+    if hasattr(log, 'encode'):
+        return log.encode()
+
+    tasks = [event.get_task() for events in log.values() for event in events]
+    labels = list(dict.fromkeys(tasks))
+    index = {task: i for i, task in enumerate(labels)}
+
+    codes = array('i', map(index.__getitem__, tasks))
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, log.values())))
+
+    return codes, offsets, labels
+
 class Event:
     def __init__(self, case):
         self._case = case
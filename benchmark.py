@@ -0,0 +1,215 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import quoteattr
+
+import log
+import conformance
+from log import stream_from_file
+
+SCALES = [
+    {'cases': 1000, 'activities': 1, 'noise': 0.0},
+    {'cases': 10000, 'activities': 1, 'noise': 0.0},
+    {'cases': 50000, 'activities': 1, 'noise': 0.0},
+    {'cases': 10000, 'activities': 2, 'noise': 0.0},
+    {'cases': 10000, 'activities': 4, 'noise': 0.0},
+    {'cases': 10000, 'activities': 1, 'noise': 0.1},
+    {'cases': 10000, 'activities': 1, 'noise': 0.3},
+]
+PHASES = ['omit_duplicate_traces', 'init_transition_sets', 'get_ordering_relations', 'init_places', 'init_flow_relations', 'build_petri_net']
+
+def benchmark_parser(path, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = 0
+        for _, trace in stream_from_file(path):
+            events += len(trace)
+
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return events, best
+
+def generate_log(source, path, cases, activities=1, noise=0.0, seed=0):
+    # cases cycle through the source traces, each copy of the activity alphabet gets a suffix
+    # and a noisy trace has two neighbouring events swapped, one dropped or one duplicated
+    rng = random.Random(seed)
+    traces = list(log.read_from_file(source).values())
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" ?>\n')
+        f.write('<log xes.version="1.0" xmlns="http://www.xes-standard.org/">\n')
+        for i in range(cases):
+            events = list(traces[i % len(traces)])
+            if len(events) > 1 and rng.random() < noise:
+                j = rng.randrange(len(events) - 1)
+                kind = rng.randrange(3)
+                if kind == 0:
+                    events[j], events[j + 1] = events[j + 1], events[j]
+                elif kind == 1:
+                    del events[j]
+                else:
+                    events.insert(j, events[j])
+
+            suffix = '' if activities <= 1 else ' #%d' % (i % activities)
+            f.write('\t<trace>\n\t\t<string key="concept:name" value="case_%d"/>\n' % i)
+            for event in events:
+                f.write('\t\t<event>\n')
+                for resource_name in event.get_resources():
+                    f.write('\t\t\t<string key="org:resource" value=%s/>\n' % quoteattr(resource_name))
+                if event.get_cost() is not None:
+                    f.write('\t\t\t<int key="cost" value="%d"/>\n' % event.get_cost())
+                f.write('\t\t\t<string key="concept:name" value=%s/>\n' % quoteattr(event.get_task() + suffix))
+                if event.get_time() is not None:
+                    f.write('\t\t\t<date key="time:timestamp" value="%s"/>\n' % event.get_time().isoformat())
+                f.write('\t\t</event>\n')
+            f.write('\t</trace>\n')
+        f.write('</log>\n')
+
+def benchmark_log(path, repeat=1):
+    timings = dict()
+
+    def timed(name, function, *args, runs=repeat):
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = function(*args)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        timings[name] = best
+        return result
+
+    parsed = timed('read_from_file', log.read_from_file, path)
+    events = sum(len(trace) for trace in parsed.values())
+    timed('dependency_graph', log.dependency_graph, parsed)
+
+    # alpha and token replay work on the conformance event objects
+    mined_log = timed('conformance.read_from_file', conformance.read_from_file, path)
+    # the alpha phases build on each other's state, so each one only runs once
+    wf_net = conformance.WorkflowNet(mined_log)
+    for phase in PHASES:
+        timed('alpha.' + phase, getattr(wf_net, phase), runs=1)
+
+    timed('fitness_token_replay', conformance.fitness_token_replay, mined_log, wf_net.get_petri_net())
+
+    return {
+        'events': events,
+        'cases': len(parsed),
+        'seconds': timings,
+        'events_per_sec': {name: (events / seconds if seconds > 0 else None) for name, seconds in timings.items()},
+        'peak_rss': peak_rss(),
+    }
+
+def peak_rss():
+    # Linux keeps ru_maxrss across exec, so even a spawned worker would report the parent's peak,
+    # while VmHWM only covers the worker's own address space
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def scale_name(scale):
+    return 'cases=%d,activities=%d,noise=%.2f' % (scale['cases'], scale['activities'], scale['noise'])
+
+def run_suite(source, scales=SCALES, work_dir='.', repeat=1):
+    results = {'source': source, 'python': sys.version.split()[0], 'scales': dict()}
+    for scale in scales:
+        name = scale_name(scale)
+        path = os.path.join(work_dir, 'benchmark-%d-%d-%d.xes' % (scale['cases'], scale['activities'], round(scale['noise'] * 100)))
+        generate_log(source, path, scale['cases'], scale['activities'], scale['noise'])
+        try:
+            # a fresh process per scale keeps the peak RSS of one run from hiding the next,
+            # and a spawned one does not start out with a copy of this process's memory
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                results['scales'][name] = executor.submit(benchmark_log, path, repeat).result()
+        finally:
+            os.remove(path)
+
+        print_result(name, results['scales'][name])
+
+    results['scaling'] = scaling(results['scales'])
+    return results
+
+def scaling(scales):
+    # the exponent k of seconds ~ events^k between the smallest and largest case-only scales
+    runs = sorted((result for name, result in scales.items() if name.endswith('activities=1,noise=0.00')), key=lambda result: result['events'])
+    if len(runs) < 2:
+        return dict()
+
+    first, last = runs[0], runs[-1]
+    exponents = dict()
+    for name, seconds in last['seconds'].items():
+        if seconds > 0 and first['seconds'].get(name, 0) > 0 and last['events'] != first['events']:
+            exponents[name] = math.log(seconds / first['seconds'][name]) / math.log(last['events'] / first['events'])
+
+    return exponents
+
+def compare(results, baseline, threshold=0.2, min_seconds=0.01):
+    regressions = []
+    for name, result in results['scales'].items():
+        previous = baseline.get('scales', dict()).get(name)
+        if previous is None:
+            continue
+
+        for phase, seconds in result['seconds'].items():
+            before = previous['seconds'].get(phase)
+            # phases this short are mostly timer noise
+            if before and max(before, seconds) >= min_seconds and seconds > before * (1 + threshold):
+                regressions.append((name, phase, before, seconds))
+
+    return regressions
+
+def print_result(name, result):
+    print("%s: %d events, peak RSS %.1f MiB" % (name, result['events'], result['peak_rss'] / (1 << 20)))
+    for phase, seconds in result['seconds'].items():
+        rate = result['events_per_sec'][phase]
+        print("  %-32s %9.4fs %12s events/sec" % (phase, seconds, '-' if rate is None else '%.0f' % rate))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', default="extension-log.xes")
+    parser.add_argument('--suite', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.suite:
+        events, elapsed = benchmark_parser(args.path)
+        print("parser: %d events in %.4fs, %.0f events/sec" % (events, elapsed, events / elapsed))
+        sys.exit(0)
+
+    results = run_suite(args.path, repeat=args.repeat)
+    for phase, exponent in sorted(results['scaling'].items()):
+        print("scaling %-32s events^%.2f" % (phase, exponent))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        for name, phase, before, after in regressions:
+            print("REGRESSION %s %s: %.4fs -> %.4fs" % (name, phase, before, after))
+
+        if regressions:
+            sys.exit(1)
@@ -1,71 +1,78 @@
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import uuid
-from itertools import chain, combinations
-
-def fitness_token_replay(log, mined_model):
+import time
+import json
+import os
+import heapq
+from array import array
+from collections import Counter, OrderedDict, deque
+from itertools import accumulate, repeat
+from operator import add, mul
+
+# NumPy is optional: with it directly_follows_matrix returns an n x n int64 ndarray,
+# without it a list of array('q') rows, and both are read as matrix[a][b]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from concurrent.futures import ProcessPoolExecutor
+
+def fitness_token_replay(log, mined_model, workers=1):
     trace_properties = get_trace_properties(log)
-    token_replay(mined_model, trace_properties)
+    if workers > 1:
+        parallel_token_replay(mined_model, trace_properties, workers)
+    else:
+        token_replay(mined_model, trace_properties)
     return calculate_fitness(trace_properties)
 
 def get_trace_properties(log):
-    properties = set()
-
-    for events in log.values():
-        trace = []
-        for event in events:
-            trace.append(event)
+    codes, offsets, _ = encode_log(log)
+    variants = dict()
 
-        trace_props = TraceProperties(trace)
+    for events, start, end in zip(log.values(), offsets, offsets[1:]):
+        variant = codes[start:end].tobytes()
 
-        if trace_props in properties:
-            for prop in properties:
-                if prop == trace_props:
-                    prop.set_occurrences(prop.get_occurrences() + 1)
+        if variant in variants:
+            prop = variants[variant]
+            prop.set_occurrences(prop.get_occurrences() + 1)
         else:
-            properties.add(trace_props)
+            variants[variant] = TraceProperties(list(events))
 
-    return properties         
+    return list(variants.values())
     
-def token_replay(model, trace_properties):
+def token_replay(model, trace_properties, max_nodes=100000):
+    net = model.compile()
+    trie = ReplayTrie(net, max_nodes)
     for prop in trace_properties:
-        p = 0
-        c = 0
-        m = 0
-        r = 0
-
-        model.add_marking(0)
-        p += 1
+        codes = net.encode(event.get_task() for event in prop.get_trace())
+        prop.set_after_replay(*trie.replay(codes))
 
-        for event in prop.get_trace():
-            transition_id = model.transition_name_to_id(event.get_task())
+def parallel_token_replay(model, trace_properties, workers):
+    net = model.compile()
+    variants = [net.encode(event.get_task() for event in prop.get_trace()) for prop in trace_properties]
+    chunksize = max(1, len(variants) // (4 * workers))
 
-            dot_t = model.dot_t(transition_id)
-            t_dot = model.t_dot(transition_id)
+    # the compiled net is pickled once per worker, only transition indices travel with the chunks
+    with ProcessPoolExecutor(workers, initializer=_init_replay_worker, initargs=(net,)) as executor:
+        results = executor.map(_replay_in_worker, variants, chunksize=chunksize)
+        for prop, counts in zip(trace_properties, results):
+            prop.set_after_replay(*counts)
 
-            if not model.is_enabled(transition_id):
-                for place in dot_t:
-                    if not place.has_tokens():
-                        place.increment_tokens()
-                        m += 1
+def replay_trace(model, tasks):
+    net = model.compile()
+    marking = net.initial_marking()
+    m, c, p = net.replay(net.encode(tasks), marking, 0, 0, 1)
+    return net.finish(marking, m, c, p)
 
-            model.fire_transition(transition_id)
-            c += len(dot_t)
-            p += len(t_dot)
-            if p + m < c and c < m:
-                raise Exception('Violation')
+_replay_trie = None
 
-        found = model.consume_end_place_token()
-        c += 1
-        if not found:
-            m += 1
-        
-        r += model.get_remaining_tokens()
-        model.clear_tokens()
+def _init_replay_worker(net):
+    global _replay_trie
+    _replay_trie = ReplayTrie(net)
 
-        prop.set_after_replay(m,c,r,p)
-        if (p + m - c) != r:
-            raise Exception('Violation')
+def _replay_in_worker(codes):
+    return _replay_trie.replay(codes)
 
 def calculate_fitness(trace_properties):
     nm = 0
@@ -81,6 +88,103 @@ def calculate_fitness(trace_properties):
     a = (1/2*(1 - nm/nc))+(1/2*(1 - nr/np))
     return a
 
+def fitness_alignments(log, mined_model, max_states=100000):
+    aligner = Aligner(mined_model, max_states)
+    total = 0
+    fitness = 0
+    for prop in get_trace_properties(log):
+        alignment = aligner.align(event.get_task() for event in prop.get_trace())
+        total += prop.get_occurrences()
+        fitness += prop.get_occurrences() * alignment.get_fitness()
+
+    return fitness / total
+
+class StreamingConformance():
+    def __init__(self, model, max_cases=100000, timeout=None):
+        self._net = model.compile()
+        self._max_cases = max_cases
+        self._timeout = timeout
+        # case id -> [marking, m, c, p, last seen], least recently seen first
+        self._cases = OrderedDict()
+        self._closed = 0
+        self._evicted = 0
+        self._missing = 0
+        self._consumed = 0
+        self._remaining = 0
+        self._produced = 0
+
+    def observe(self, case_id, activity, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        state = self._cases.get(case_id)
+        if state is None:
+            self._expire(now)
+            if len(self._cases) >= self._max_cases:
+                self._evict(next(iter(self._cases)))
+
+            state = [self._net.initial_marking(), 0, 0, 1, now]
+            self._cases[case_id] = state
+        else:
+            self._cases.move_to_end(case_id)
+            state[4] = now
+
+        state[1], state[2], state[3] = self._net.replay(self._net.encode((activity,)), state[0], state[1], state[2], state[3])
+
+    def close(self, case_id):
+        state = self._cases.pop(case_id, None)
+        if state is None:
+            return None
+
+        m, c, r, p = self._net.finish(*state[:4])
+        self._closed += 1
+        self._missing += m
+        self._consumed += c
+        self._remaining += r
+        self._produced += p
+        return m, c, r, p
+
+    def expire(self, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        return self._expire(now)
+
+    def _expire(self, now):
+        if self._timeout is None:
+            return 0
+
+        expired = 0
+        for case_id, state in self._cases.items():
+            if now - state[4] < self._timeout:
+                break
+            expired += 1
+
+        for _ in range(expired):
+            self._evict(next(iter(self._cases)))
+
+        return expired
+
+    def _evict(self, case_id):
+        # a case dropped before it was closed never finished, so it stays out of the fitness totals
+        del self._cases[case_id]
+        self._evicted += 1
+
+    def get_fitness(self):
+        if self._closed == 0:
+            return None
+
+        return (1/2*(1 - self._missing/self._consumed))+(1/2*(1 - self._remaining/self._produced))
+
+    def get_open_cases(self):
+        return len(self._cases)
+
+    def get_closed_cases(self):
+        return self._closed
+
+    def get_evicted_cases(self):
+        return self._evicted
+
 class TraceProperties():
     def __init__(self, trace,):
         self._trace = trace
@@ -124,6 +228,274 @@ class TraceProperties():
         if isinstance(other, TraceProperties):
             return self._trace == other.get_trace()
 
+class ReplayTrie():
+    def __init__(self, net, max_nodes=100000):
+        self._net = net
+        self._max_nodes = max_nodes
+        self._root = ReplayTrieNode(net.initial_marking(), 0, 0, 1)
+        self._size = 1
+        self._clock = 0
+
+    def replay(self, codes):
+        if self._size >= self._max_nodes:
+            self._evict()
+
+        self._clock += 1
+        node = self._root
+        node.last_used = self._clock
+
+        # walk the longest prefix that was replayed before
+        i = 0
+        while i < len(codes) and codes[i] in node.children:
+            node = node.children[codes[i]]
+            node.last_used = self._clock
+            i += 1
+
+        marking = list(node.marking)
+        m, c, p = node.missing, node.consumed, node.produced
+        while i < len(codes) and self._size < self._max_nodes:
+            m, c, p = self._net.replay(codes[i:i+1], marking, m, c, p)
+            child = ReplayTrieNode(list(marking), m, c, p)
+            child.last_used = self._clock
+            node.children[codes[i]] = child
+            self._size += 1
+            node = child
+            i += 1
+
+        m, c, p = self._net.replay(codes[i:], marking, m, c, p)
+        return self._net.finish(marking, m, c, p)
+
+    def get_size(self):
+        return self._size
+
+    def _evict(self):
+        # a node is never colder than its descendants, so dropping the coldest nodes drops cold subtrees
+        entries = []
+        stack = [self._root]
+        while stack:
+            parent = stack.pop()
+            for task, child in parent.children.items():
+                entries.append((child.last_used, parent, task))
+                stack.append(child)
+
+        entries.sort(key=lambda entry: entry[0])
+        for _, parent, task in entries:
+            if self._size <= self._max_nodes // 2:
+                break
+
+            # skip entries inside a subtree that is already gone
+            if parent.last_used < 0:
+                continue
+
+            child = parent.children.pop(task)
+            self._size -= self._count_nodes(child)
+            self._mark_evicted(child)
+
+    def _count_nodes(self, node):
+        count = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children.values())
+
+        return count
+
+    def _mark_evicted(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            node.last_used = -1
+            stack.extend(node.children.values())
+
+class ReplayTrieNode():
+    def __init__(self, marking, missing, consumed, produced):
+        self.marking = marking
+        self.missing = missing
+        self.consumed = consumed
+        self.produced = produced
+        self.children = dict()
+        self.last_used = 0
+
+SKIP = '>>'
+
+class Aligner():
+    def __init__(self, model, max_states=100000, completion_states=100000):
+        self._net = model.compile()
+        self._max_states = max_states
+        self._completion_states = completion_states
+        self._labels = self._net.get_labels()
+        self._initial = tuple(self._net.initial_marking())
+        self._final = self._net.final_markings()
+        self._alignments = dict()
+        self._completions = dict()
+        self._may_fire = dict()
+
+    def align(self, tasks):
+        tasks = tuple(tasks)
+        alignment = self._alignments.get(tasks)
+        if alignment is None:
+            alignment = self._search(tasks)
+            self._alignments[tasks] = alignment
+
+        return alignment
+
+    def get_shortest_run(self):
+        return self._complete(self._initial)
+
+    def _search(self, tasks):
+        n = len(tasks)
+        codes = [t if t < len(self._labels) else -1 for t in self._net.encode(tasks)]
+
+        # an event whose transition no run from the marking can fire is a log move in every completion,
+        # and with no synchronous move left a marking that is not final still needs a model move
+        def h(pos, marking):
+            transitions = self._may_fire.get(marking)
+            if transitions is None:
+                transitions = self._may_fire[marking] = self._net.may_fire(marking)
+
+            blocked = sum(1 for t in codes[pos:] if t not in transitions)
+            if blocked == n - pos and marking not in self._final:
+                return blocked + 1
+            return blocked
+
+        start = (0, self._initial)
+        costs = {start: 0}
+        parents = {start: None}
+        closed = set()
+        heap = [(h(0, self._initial), 0, 0, start)]
+        pushed = 1
+        best = start
+
+        while heap:
+            _, _, _, state = heapq.heappop(heap)
+            if state in closed:
+                continue
+
+            closed.add(state)
+            pos, marking = state
+            g = costs[state]
+
+            if pos == n and marking in self._final:
+                return Alignment(self._moves(parents, state), g, n, self.get_shortest_run(), True)
+
+            if pos > best[0] or (pos == best[0] and g < costs[best]):
+                best = state
+
+            if len(closed) >= self._max_states:
+                break
+
+            successors = []
+            if pos < n:
+                successors.append(((pos + 1, marking), 1, (tasks[pos], SKIP)))
+                t = codes[pos]
+                if t >= 0 and self._net.enabled(marking, t):
+                    successors.append(((pos + 1, self._net.fire(marking, t)), 0, (tasks[pos], tasks[pos])))
+
+            for t in range(len(self._labels)):
+                if self._net.enabled(marking, t):
+                    successors.append(((pos, self._net.fire(marking, t)), 1, (SKIP, self._labels[t])))
+
+            for successor, cost, move in successors:
+                if successor in closed or g + cost >= costs.get(successor, g + cost + 1):
+                    continue
+
+                costs[successor] = g + cost
+                parents[successor] = (state, move)
+                heapq.heappush(heap, (g + cost + h(*successor), -successor[0], pushed, successor))
+                pushed += 1
+
+        # the state cap was hit, finish from the furthest state with log moves and the shortest model completion
+        pos, marking = best
+        moves = self._moves(parents, best)
+        moves.extend((task, SKIP) for task in tasks[pos:])
+        completion = self._complete(marking)
+        if completion is None:
+            # no final marking within reach from there, skip the whole trace and run the model instead
+            moves = [(task, SKIP) for task in tasks]
+            completion = self.get_shortest_run()
+
+        if completion is None:
+            # without any run to a final marking the cost is only a lower bound
+            return Alignment(moves, len(moves), n, None, False, False)
+
+        moves.extend((SKIP, label) for label in completion)
+        cost = sum(1 for move in moves if SKIP in move)
+        return Alignment(moves, cost, n, self.get_shortest_run(), False)
+
+    def _complete(self, marking):
+        if marking in self._completions:
+            return self._completions[marking]
+
+        parents = {marking: None}
+        frontier = deque([marking])
+        completion = None
+        while frontier and len(parents) < self._completion_states:
+            current = frontier.popleft()
+            if current in self._final:
+                completion = []
+                while parents[current] is not None:
+                    current, t = parents[current]
+                    completion.append(self._labels[t])
+                completion.reverse()
+                break
+
+            for t in range(len(self._labels)):
+                if self._net.enabled(current, t):
+                    successor = self._net.fire(current, t)
+                    if successor not in parents:
+                        parents[successor] = (current, t)
+                        frontier.append(successor)
+
+        # a search cut off by the budget is not cached as unreachable
+        if completion is not None:
+            self._completions[marking] = completion
+        return completion
+
+    def _moves(self, parents, state):
+        moves = []
+        while parents[state] is not None:
+            state, move = parents[state]
+            moves.append(move)
+
+        moves.reverse()
+        return moves
+
+class Alignment():
+    def __init__(self, moves, cost, trace_length, shortest_run, optimal, complete=True):
+        self._moves = moves
+        self._cost = cost
+        self._trace_length = trace_length
+        self._shortest_run = shortest_run
+        self._optimal = optimal
+        self._complete = complete
+
+    def get_moves(self):
+        return self._moves
+
+    def get_cost(self):
+        return self._cost
+
+    def is_optimal(self):
+        return self._optimal
+
+    def is_complete(self):
+        return self._complete
+
+    def get_fitness(self):
+        if not self._complete:
+            return 0.0
+
+        # the worst alignment skips every event and then runs the shortest model path
+        worst = self._trace_length
+        if self._shortest_run is not None:
+            worst += len(self._shortest_run)
+
+        if worst == 0:
+            return 1.0
+
+        return max(0.0, 1 - self._cost / worst)
+
 def alpha(log):
     wf_net = WorkflowNet(log)
     wf_net.omit_duplicate_traces()
@@ -141,13 +513,14 @@ class WorkflowNet():
         self.T_W = set()
         self.T_I = set()
         self.T_O = set()
-        self.X_W = set()
         self.Y_W = set()
         self.P_W = set()
         self.F_W = set()
         self._direct_successions = set()
-        self._choices = set()
         self._causals = set()
+        self._footprint = None
+        self._choice_neighbours = []
+        self._causal_successors = []
         self._petri_net = None
     
     def omit_duplicate_traces(self):
@@ -169,8 +542,8 @@ class WorkflowNet():
     
     def get_ordering_relations(self):
         self._get_direct_successions()
-        self._get_choices()
         self._get_causals()
+        self._footprint = Footprint(self.T_W, self._direct_successions)
 
     def init_transition_sets(self):
         all_events = set()
@@ -181,7 +554,9 @@ class WorkflowNet():
             end_events.add(events[-1])
             all_events = all_events.union(set(event for event in events))
         
-        self.T_W = self.T_W.union(set([Transition.from_event(event) for event in all_events]))
+        # transitions get dense negative ids in alphabet order, place ids stay non-negative
+        ordered_events = sorted(all_events, key=lambda event: event.get_task())
+        self.T_W = self.T_W.union(set([Transition.from_event(event, -(i + 1)) for i, event in enumerate(ordered_events)]))
 
         for T in self.T_W:
             for initial in initial_events:
@@ -196,22 +571,20 @@ class WorkflowNet():
         if len(self.T_W) <= 0:
             return
         
-        T_W_subsets = self._get_all_nonempty_subsets(self.T_W)
+        # only transitions without a self loop can be part of A or B
+        n = len(self._footprint)
+        candidates = 0
+        for i in range(n):
+            if self._footprint.choice(i) >> i & 1:
+                candidates |= 1 << i
 
-        for A in T_W_subsets:
-            for B in T_W_subsets:
-                if self._are_X_W_elements(A, B):
-                    self.X_W.add((A, B))
-        
-        self.Y_W = self.X_W.copy()
-        for A, B in self.X_W:
-            for A_prime, B_prime in self.X_W:
-                if (A, B) != (A_prime, B_prime) and set(A).issubset(A_prime) and set(B).issubset(B_prime):
-                    self.Y_W.discard((A, B))
+        self._choice_neighbours = [self._footprint.choice(i) & candidates & ~(1 << i) for i in range(n)]
+        self._causal_successors = [self._footprint.causal(i) & candidates for i in range(n)]
+        self._grow_A(0, candidates, candidates)
 
         self.P_W.add(Place(0, 0, None, self.T_I))
         i = 1
-        for A, B in self.Y_W:
+        for A, B in sorted(self.Y_W, key=lambda place: (self._names(place[0]), self._names(place[1]))):
             self.P_W.add(Place(i, 0, A, B))
             i+=1
         self.P_W.add(Place(i, 0, self.T_O, None))
@@ -233,19 +606,16 @@ class WorkflowNet():
     def get_petri_net(self):
         return self._petri_net
 
-    def _get_all_nonempty_subsets(self, iterable):
-        s = list(iterable)
-        return list(chain.from_iterable(combinations(s, r) for r in range(1, len(s)+1)))
+    def _names(self, transitions):
+        return [t.get_name() for t in transitions]
 
     def _get_direct_successions(self):
+        # Don't want to recreate transition so, we find it within the existing ones
+        transitions = {t.get_name(): t for t in self.T_W}
         for events in self._log.values():
             prev_transition = None
             for event in events:
-                transition = None
-                # Don't want to recreate transition so, we find it within the existing ones
-                for t in self.T_W:
-                    if t.get_name() == event.get_task():
-                        transition = t
+                transition = transitions.get(event.get_task())
 
                 if prev_transition is not None:
                     self._direct_successions.add((prev_transition, transition))
@@ -257,58 +627,240 @@ class WorkflowNet():
             if (succession[1], succession[0]) not in self._direct_successions:
                 self._causals.add(succession)
 
-    def _get_choices(self):
-        for outer_transition in self.T_W:
-            for inner_transition in self.T_W:
-                left_right_relation = (outer_transition, inner_transition)
-                right_left_relation = (inner_transition, outer_transition)
+    def _grow_A(self, A, candidates, successors):
+        # all masks: candidates are in # with every element of A, successors are caused by every element of A
+        while candidates:
+            a = lowest_bit(candidates)
+            candidates &= candidates - 1
 
-                if left_right_relation in self._direct_successions or right_left_relation in self._direct_successions:
-                    continue
-                
-                self._choices.add(left_right_relation)
+            A_successors = successors & self._causal_successors[a]
+            if A_successors == 0:
+                continue
 
-    def _are_X_W_elements(self, A, B):
-        if len(A) <= 0:
-            return False
+            new_A = A | (1 << a)
+            for B in self._maximal_B(0, A_successors, 0):
+                if self._is_maximal_A(new_A, B):
+                    self.Y_W.add((self._footprint.members(new_A), self._footprint.members(B)))
+
+            self._grow_A(new_A, candidates & self._choice_neighbours[a], A_successors)
+
+    def _maximal_B(self, B, candidates, excluded):
+        # Bron-Kerbosch enumeration of the maximal #-cliques among the candidates
+        if candidates == 0 and excluded == 0:
+            yield B
+            return
+
+        while candidates:
+            b = lowest_bit(candidates)
+            neighbours = self._choice_neighbours[b]
+            yield from self._maximal_B(B | (1 << b), candidates & neighbours, excluded & neighbours)
+            candidates &= ~(1 << b)
+            excluded |= 1 << b
+
+    def _is_maximal_A(self, A, B):
+        # a transition in # with all of A that causes all of B would extend the pair
+        extensions = self._choice_neighbours[lowest_bit(A)] & ~A
+        rest = A
+        while rest:
+            extensions &= self._choice_neighbours[lowest_bit(rest)]
+            rest &= rest - 1
+
+        while extensions:
+            if self._causal_successors[lowest_bit(extensions)] & B == B:
+                return False
+            extensions &= extensions - 1
 
-        if len(B) <= 0:
-            return False
-        
-        for a_1 in A:
-            for a_2 in A:
-                if (a_1, a_2) not in self._choices:
-                    return False
-            
-            for b in B:
-                if (a_1, b) not in self._causals:
-                    return False
-
-        for b_1 in B:
-            for b_2 in B:
-                if (b_1, b_2) not in self._choices:
-                    return False
-        
         return True
 
+class Footprint():
+    def __init__(self, transitions, direct_successions):
+        self._transitions = sorted(transitions, key=lambda t: t.get_name())
+        self._index = {t: i for i, t in enumerate(self._transitions)}
+        self._all = (1 << len(self._transitions)) - 1
+
+        # bit j of follows[i] is set when t_i is directly followed by t_j
+        self._follows = [0] * len(self._transitions)
+        self._precedes = [0] * len(self._transitions)
+        for source, target in direct_successions:
+            i = self._index[source]
+            j = self._index[target]
+            self._follows[i] |= 1 << j
+            self._precedes[j] |= 1 << i
+
+    def index(self, transition):
+        return self._index[transition]
+
+    def members(self, mask):
+        members = []
+        while mask:
+            members.append(self._transitions[lowest_bit(mask)])
+            mask &= mask - 1
+
+        return tuple(members)
+
+    def causal(self, i):
+        return self._follows[i] & ~self._precedes[i]
+
+    def inverse_causal(self, i):
+        return self._precedes[i] & ~self._follows[i]
+
+    def choice(self, i):
+        return self._all & ~(self._follows[i] | self._precedes[i])
+
+    def parallel(self, i):
+        return self._follows[i] & self._precedes[i]
+
+    def __len__(self):
+        return len(self._transitions)
+
+def lowest_bit(mask):
+    return (mask & -mask).bit_length() - 1
+
 class PetriNet():
     def __init__(self, places=None, transitions=None, edges=None):
-        self._places = set() if places is None else places
-        self._transitions = set() if transitions is None else transitions
-        self._edges = set() if edges is None else edges
+        self._places = set()
+        self._transitions = set()
+        self._edges = set()
+        self._places_by_id = dict()
+        self._place_index = dict()
+        self._transitions_by_name = dict()
+        self._preset = dict()
+        self._postset = dict()
+        self._compiled = None
+        # transition id -> number of input places without tokens, built on first use
+        self._unsatisfied = None
+        self._enabled = None
+        self._transitions_by_id = None
+
+        for place in [] if places is None else places:
+            self._index_place(place)
+        for transition in [] if transitions is None else transitions:
+            self._index_transition(transition)
+        for edge in [] if edges is None else edges:
+            self._index_edge(edge)
 
     def add_place(self, name):
-        self._places.add(Place(name))
+        self._index_place(Place(name))
         return self
 
     def add_transition(self, name, id):
-        self._transitions.add(Transition(name, id))
+        self._index_transition(Transition(name, id))
         return self
 
     def add_edge(self, source, target):
-        self._edges.add(Edge(source, target))
+        self._index_edge(Edge(source, target))
         return self
 
+    def save(self, path):
+        places = list(self._places_by_id.values())
+        place_index = {place.get_id(): i for i, place in enumerate(places)}
+        transitions = sorted(self._transitions, key=lambda t: t.get_id())
+
+        # compressed sparse rows: the arcs of transition t are preset[preset_offsets[t]:preset_offsets[t + 1]]
+        preset_offsets = array('q', [0])
+        preset = array('i')
+        postset_offsets = array('q', [0])
+        postset = array('i')
+        for transition in transitions:
+            preset.extend(place_index[id] for id in self._preset.get(transition.get_id(), []) if id in place_index)
+            preset_offsets.append(len(preset))
+            postset.extend(place_index[id] for id in self._postset.get(transition.get_id(), []) if id in place_index)
+            postset_offsets.append(len(postset))
+
+        columns = [
+            array('q', [place.get_id() for place in places]),
+            array('q', [place.get_tokens() for place in places]),
+            array('q', [transition.get_id() for transition in transitions]),
+            preset_offsets,
+            preset,
+            postset_offsets,
+            postset,
+        ]
+        header = json.dumps({
+            'names': [transition.get_name() for transition in transitions],
+            'lengths': [len(column) for column in columns],
+        }).encode('utf-8')
+
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(NET_MAGIC)
+                f.write(len(header).to_bytes(8, 'little'))
+                f.write(header)
+                for column in columns:
+                    f.write(column.tobytes())
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if data[:8] != NET_MAGIC:
+            raise ValueError('%s is not a saved PetriNet' % path)
+
+        try:
+            header_end = 16 + int.from_bytes(data[8:16], 'little')
+            if header_end > len(data):
+                raise ValueError('header runs past the end of the file')
+            header = json.loads(data[16:header_end].decode('utf-8'))
+            if len(header['lengths']) != 7:
+                raise ValueError('expected 7 columns')
+
+            columns = []
+            start = header_end
+            for typecode, length in zip('qqqqiqi', header['lengths']):
+                column = array(typecode)
+                end = start + length * column.itemsize
+                if length < 0 or end > len(data):
+                    raise ValueError('column runs past the end of the file')
+                column.frombytes(data[start:end])
+                columns.append(column)
+                start = end
+            if start != len(data):
+                raise ValueError('trailing bytes after the last column')
+            place_ids, tokens, transition_ids, preset_offsets, preset, postset_offsets, postset = columns
+
+            # the CSR arrays have to describe exactly the places and transitions in the file
+            if len(tokens) != len(place_ids) or len(header['names']) != len(transition_ids):
+                raise ValueError('column lengths do not match')
+            for offsets, indices in ((preset_offsets, preset), (postset_offsets, postset)):
+                if len(offsets) != len(transition_ids) + 1 or offsets[0] != 0 or offsets[-1] != len(indices):
+                    raise ValueError('arc offsets do not match')
+                if any(a > b for a, b in zip(offsets, offsets[1:])) or any(i < 0 or i >= len(place_ids) for i in indices):
+                    raise ValueError('arcs point outside the net')
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError('%s is a damaged PetriNet file: %s' % (path, e))
+
+        # fill the indexes straight from the arrays instead of replaying add_place, add_transition and add_edge
+        net = cls()
+        for i, id in enumerate(place_ids):
+            place = Place(id, tokens[i])
+            net._places.add(place)
+            net._places_by_id[id] = place
+            net._place_index[id] = i
+
+        for t, id in enumerate(transition_ids):
+            transition = Transition(header['names'][t], id)
+            net._transitions.add(transition)
+            net._transitions_by_name.setdefault(transition.get_name(), transition)
+
+            net._preset[id] = [place_ids[i] for i in preset[preset_offsets[t]:preset_offsets[t + 1]]]
+            for place_id in net._preset[id]:
+                net._postset.setdefault(place_id, []).append(id)
+                net._edges.add(Edge(place_id, id))
+
+            net._postset[id] = [place_ids[i] for i in postset[postset_offsets[t]:postset_offsets[t + 1]]]
+            for place_id in net._postset[id]:
+                net._preset.setdefault(place_id, []).append(id)
+                net._edges.add(Edge(id, place_id))
+
+        return net
+
     def get_tokens(self, id):
         return self._get_place_by_id(id).get_tokens()
 
@@ -330,17 +882,17 @@ class PetriNet():
         return True
 
     def get_enabled_transitions(self):
-        transitions = []
-        for transition in self._transitions:
-            if self.is_enabled(transition.get_id()):
-                transitions.append(transition)
+        if self._enabled is None:
+            self._init_enabled()
 
-        return transitions
+        return list(self._enabled.values())
 
     def add_marking(self, place_id):
-        for place in self._places:
-            if place.get_id() == place_id:
-                place.increment_tokens()
+        place = self._get_place_by_id(place_id)
+        if place is not None:
+            marked = place.has_tokens()
+            place.increment_tokens()
+            self._update_enabled(place, marked)
 
     def fire_transition(self, transition):
         if not self.is_enabled(transition):
@@ -350,60 +902,250 @@ class PetriNet():
         t_dot = self.t_dot(transition)
 
         for place in dot_t:
+            marked = place.has_tokens()
             place.decrement_tokens()
+            self._update_enabled(place, marked)
 
         for place in t_dot:
+            marked = place.has_tokens()
             place.increment_tokens()
+            self._update_enabled(place, marked)
 
     def transition_name_to_id(self, name):
-        for transition in self._transitions:
-            if transition.get_name() == name:
-                return transition.get_id()
-        
-        return None
+        transition = self._transitions_by_name.get(name)
+        if transition is None:
+            return None
+
+        return transition.get_id()
 
     def clear_tokens(self):
         for place in self._places:
             place.clear_tokens()
+        self._enabled = None
 
     def consume_end_place_token(self):
         found = False
         for place in self._places:
-            is_end = True
-            for edge in self._edges:
-                if edge.is_source(place.get_id()):
-                    is_end = False
-
-            if is_end and place.has_tokens():
+            if self.is_end_place(place.get_id()) and place.has_tokens():
                 found = True
                 place.decrement_tokens()
+                self._update_enabled(place, True)
 
         return found
 
-    def dot_t(self, t):
-        dot_t = set()
-        for edge in self._edges:
-            if edge.is_target(t):
-                place = self._get_place_by_id(edge.get_source())
-                dot_t.add(place)
+    def compile(self):
+        if self._compiled is None:
+            self._compiled = CompiledNet(self)
 
-        return dot_t
+        return self._compiled
 
-    def t_dot(self, t):
-        t_dot = set()
-        for edge in self._edges:
-            if edge.is_source(t):
-                place = self._get_place_by_id(edge.get_target())
-                t_dot.add(place)
+    def get_place_index(self):
+        return self._place_index
 
-        return t_dot
+    def get_transitions_by_name(self):
+        return self._transitions_by_name
+
+    def is_end_place(self, place_id):
+        return len(self._postset.get(place_id, [])) <= 0
+
+    def dot_t(self, t):
+        return set(self._get_place_by_id(id) for id in self._preset.get(t, []))
+
+    def t_dot(self, t):
+        return set(self._get_place_by_id(id) for id in self._postset.get(t, []))
 
     def _get_place_by_id(self, id):
-        for place in self._places:
-            if place.get_id() == id:
-                return place
+        return self._places_by_id.get(id)
+
+    def preset_indices(self, t):
+        return [self._place_index[id] for id in self._preset.get(t, []) if id in self._place_index]
+
+    def postset_indices(self, t):
+        return [self._place_index[id] for id in self._postset.get(t, []) if id in self._place_index]
+
+    def _init_enabled(self):
+        self._unsatisfied = dict()
+        self._enabled = dict()
+        self._transitions_by_id = dict()
+
+        for transition in self._transitions:
+            id = transition.get_id()
+            self._transitions_by_id[id] = transition
+            self._unsatisfied[id] = sum(1 for place in self.dot_t(id) if not place.has_tokens())
+            if self._unsatisfied[id] == 0:
+                self._enabled[id] = transition
+
+    def _update_enabled(self, place, marked):
+        # only the transitions consuming from a place that became (un)marked can change state
+        if self._enabled is None or place.has_tokens() == marked:
+            return
+
+        delta = 1 if marked else -1
+        for id in self._postset.get(place.get_id(), []):
+            if id not in self._unsatisfied:
+                continue
+
+            self._unsatisfied[id] += delta
+            if self._unsatisfied[id] == 0:
+                self._enabled[id] = self._transitions_by_id[id]
+            else:
+                self._enabled.pop(id, None)
+
+    def _index_place(self, place):
+        if place.get_id() in self._places_by_id:
+            return
+
+        self._places.add(place)
+        self._places_by_id[place.get_id()] = place
+        self._place_index[place.get_id()] = len(self._place_index)
+        self._compiled = None
+        self._enabled = None
+
+    def _index_transition(self, transition):
+        if transition in self._transitions:
+            return
+
+        self._transitions.add(transition)
+        self._enabled = None
+        if transition.get_name() not in self._transitions_by_name:
+            self._transitions_by_name[transition.get_name()] = transition
+            self._compiled = None
 
-        return None
+    def _index_edge(self, edge):
+        if edge in self._edges:
+            return
+
+        self._edges.add(edge)
+        self._postset.setdefault(edge.get_source(), []).append(edge.get_target())
+        self._preset.setdefault(edge.get_target(), []).append(edge.get_source())
+        self._compiled = None
+        self._enabled = None
+
+class CompiledNet():
+    def __init__(self, model):
+        place_index = model.get_place_index()
+        self._num_places = len(place_index)
+        self._start = place_index.get(0)
+        self._end_places = [i for id, i in place_index.items() if model.is_end_place(id)]
+        self._transition_index = dict()
+        self._labels = []
+        self._presets = []
+        self._postsets = []
+
+        # transitions get dense indices in id order, markings are indexed like get_place_index
+        for transition in sorted(model.get_transitions_by_name().values(), key=lambda t: t.get_id()):
+            self._transition_index[transition.get_name()] = len(self._labels)
+            self._labels.append(transition.get_name())
+            self._presets.append(model.preset_indices(transition.get_id()))
+            self._postsets.append(model.postset_indices(transition.get_id()))
+
+        # unknown activities map to a transition without arcs, like a None id did before
+        self._unknown = len(self._presets)
+        self._presets.append([])
+        self._postsets.append([])
+
+    def encode(self, tasks):
+        return [self._transition_index.get(task, self._unknown) for task in tasks]
+
+    def get_labels(self):
+        return self._labels
+
+    def initial_marking(self):
+        marking = [0] * self._num_places
+        if self._start is not None:
+            marking[self._start] += 1
+
+        return marking
+
+    def enabled(self, marking, t):
+        for i in self._presets[t]:
+            if marking[i] <= 0:
+                return False
+
+        return True
+
+    def fire(self, marking, t):
+        # markings are immutable tuples, so they can be hashed, shared and cached
+        marking = list(marking)
+        for i in self._presets[t]:
+            marking[i] -= 1
+
+        for i in self._postsets[t]:
+            marking[i] += 1
+
+        return tuple(marking)
+
+    def final_markings(self):
+        finals = set()
+        for i in self._end_places:
+            marking = [0] * self._num_places
+            marking[i] = 1
+            finals.add(tuple(marking))
+
+        return finals
+
+    def may_fire(self, marking):
+        # a transition some run from the marking fires needs its preset marked or produced by such a transition
+        marked = set(i for i, tokens in enumerate(marking) if tokens > 0)
+        transitions = set()
+        grown = True
+        while grown:
+            grown = False
+            for t in range(len(self._labels)):
+                if t not in transitions and all(i in marked for i in self._presets[t]):
+                    transitions.add(t)
+                    marked.update(self._postsets[t])
+                    grown = True
+
+        return transitions
+
+    def remaining(self, marking):
+        return sum(marking)
+
+    def replay(self, codes, marking, m, c, p):
+        presets = self._presets
+        postsets = self._postsets
+
+        for t in codes:
+            preset = presets[t]
+            postset = postsets[t]
+
+            for i in preset:
+                if marking[i] <= 0:
+                    marking[i] += 1
+                    m += 1
+
+                marking[i] -= 1
+
+            for i in postset:
+                marking[i] += 1
+
+            c += len(preset)
+            p += len(postset)
+            if p + m < c and c < m:
+                raise Exception('Violation')
+
+        return m, c, p
+
+    def finish(self, marking, m, c, p):
+        found = False
+        for i in self._end_places:
+            if marking[i] > 0:
+                found = True
+                marking[i] -= 1
+
+        c += 1
+        if not found:
+            m += 1
+
+        r = sum(marking)
+
+        if (p + m - c) != r:
+            raise Exception('Violation')
+
+        return m, c, r, p
+
+NET_MAGIC = b'PETRINET'
 
 class Place():
     def __init__(self, id, num_of_tokens=0, A=None, B=None):
@@ -452,9 +1194,9 @@ class Transition():
         self._id = id
 
     @classmethod
-    def from_event(cls, event):
+    def from_event(cls, event, id=None):
         name = event.get_task()
-        id = uuid.uuid4()
+        id = uuid.uuid4() if id is None else id
         return cls(name, id)
 
     def get_id(self):
@@ -468,7 +1210,7 @@ class Transition():
 
     def __eq__(self, other):
         if isinstance(other, Transition):
-            return self._id == self._id
+            return self._id == other._id
 
 class Edge():
     def __init__(self, left, right):
@@ -495,21 +1237,28 @@ class Edge():
             return self._source == other._source and self._target == other._target
 
 def read_from_file(path):
-    tree = ET.parse(path)
-    root = tree.getroot()
-
     cases = dict()
 
-    for trace in root:
-        if not trace.tag.endswith('trace'):
+    for case, events in stream_from_file(path):
+        if case not in cases.keys():
+            cases[case] = []
+        cases[case].extend(events)
+
+    return cases
+
+def stream_from_file(path):
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+
+    for action, trace in context:
+        if action != 'end' or not trace.tag.endswith('trace'):
             continue
 
         case = None
+        events = []
         for event in trace:
             if event.tag.endswith('string'):
                 case = event.get('value')
-                if case not in cases.keys():
-                    cases[case] = []
                 continue
 
             event_wrapper = Event(case)
@@ -526,11 +1275,26 @@ def read_from_file(path):
                 else:
                     event_wrapper.add_resource(child.get('value'))
 
-            cases[case].append(event_wrapper)
+            events.append(event_wrapper)
 
-    return cases
+        yield case, events
+        # drop the consumed trace so only the one being read stays in memory
+        root.clear()
 
 def dependency_graph(log):
+    # columnar logs already hold their activity codes, a dict log is cheaper to count in one pass
+    if hasattr(log, 'encode'):
+        matrix, labels = dependency_matrix(log)
+
+        dg = dict()
+        for i, task in enumerate(labels):
+            dg[task] = dict()
+            for j, count in enumerate(matrix[i].tolist()):
+                if count > 0:
+                    dg[task][labels[j]] = count
+
+        return dg
+
     dg = dict()
     for _, events in log.items():
         prev_task = None
@@ -549,6 +1313,48 @@ def dependency_graph(log):
 
     return dg
 
+def dependency_matrix(log):
+    codes, offsets, labels = encode_log(log)
+    return directly_follows_matrix(codes, offsets, len(labels)), labels
+
+def directly_follows_matrix(codes, offsets, n):
+    if np is not None:
+        codes = np.asarray(codes, dtype=np.int64)
+        keys = codes[:-1] * n + codes[1:]
+        # the pairs across a case boundary are not directly-follows pairs
+        boundaries = np.asarray(offsets, dtype=np.int64)[1:-1]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[boundaries[(boundaries > 0) & (boundaries < len(codes))] - 1] = False
+        return np.bincount(keys[keep], minlength=n * n).astype(np.int64).reshape(n, n)
+
+    # every pair of neighbouring codes is counted under the key prev * n + next
+    counts = Counter(map(add, map(mul, codes, repeat(n)), codes[1:]))
+    # the pairs across a case boundary are not directly-follows pairs
+    for boundary in set(offsets[1:-1]):
+        if 0 < boundary < len(codes):
+            counts[codes[boundary - 1] * n + codes[boundary]] -= 1
+
+    matrix = [array('q', bytes(8 * n)) for _ in range(n)]
+    for key, count in counts.items():
+        matrix[key // n][key % n] = count
+
+    return matrix
+
+def encode_log(log):
+    # columnar logs already hold their activity codes
+    if hasattr(log, 'encode'):
+        return log.encode()
+
+    tasks = [event.get_task() for events in log.values() for event in events]
+    labels = list(dict.fromkeys(tasks))
+    index = {task: i for i, task in enumerate(labels)}
+
+    codes = array('i', map(index.__getitem__, tasks))
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, log.values())))
+
+    return codes, offsets, labels
+
 class Event:
     def __init__(self, case):
         self._case = case
@@ -0,0 +1,220 @@
+from itertools import repeat
+from operator import add, sub, truediv
+
+from conformance import PetriNet, Place, Transition, Edge, dependency_matrix, encode_log
+
+# NumPy is optional: with it the measures are computed on the ndarray from dependency_matrix,
+# without it on the list of array('q') rows
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def heuristics(log, dependency_threshold=0.9, positive_observations=10, relative_to_best=0.05, and_threshold=0.1):
+    h_net = HeuristicsNet(log, dependency_threshold, positive_observations, relative_to_best, and_threshold)
+    h_net.init_dependency_measures()
+    h_net.init_dependency_graph()
+    h_net.init_splits_and_joins()
+    h_net.init_places()
+    h_net.init_flow_relations()
+    h_net.build_petri_net()
+
+    return h_net.get_petri_net()
+
+class HeuristicsNet():
+    def __init__(self, log, dependency_threshold=0.9, positive_observations=10, relative_to_best=0.05, and_threshold=0.1):
+        self._dependency_threshold = dependency_threshold
+        self._positive_observations = positive_observations
+        self._relative_to_best = relative_to_best
+        self._and_threshold = and_threshold
+
+        self._matrix, self._labels = dependency_matrix(log)
+        codes, offsets, _ = encode_log(log)
+        n = len(self._labels)
+        self._starts = [0] * n
+        self._ends = [0] * n
+        for start, end in zip(offsets, offsets[1:]):
+            if start < end:
+                self._starts[codes[start]] += 1
+                self._ends[codes[end - 1]] += 1
+
+        self._dependencies = []
+        self._outputs = [set() for _ in range(n)]
+        self._inputs = [set() for _ in range(n)]
+        self._start_activities = set()
+        self._end_activities = set()
+        self._output_groups = []
+        self._input_groups = []
+        self.T_W = set()
+        self.P_W = set()
+        self.F_W = set()
+        self._petri_net = None
+
+    def init_dependency_measures(self):
+        if np is not None:
+            # (|a>b| - |b>a|) / (|a>b| + |b>a| + 1) for the whole matrix at once
+            matrix = np.asarray(self._matrix, dtype=np.float64)
+            self._dependencies = (matrix - matrix.T) / (matrix + matrix.T + 1)
+            # a self loop only has |a>a| to go on
+            loops = np.diagonal(matrix)
+            np.fill_diagonal(self._dependencies, loops / (loops + 1))
+            return
+
+        # (|a>b| - |b>a|) / (|a>b| + |b>a| + 1), one row at a time
+        columns = [list(column) for column in zip(*self._matrix)]
+        for a, row in enumerate(self._matrix):
+            column = columns[a]
+            self._dependencies.append(list(map(truediv, map(sub, row, column), map(add, map(add, row, column), repeat(1)))))
+
+            # a self loop only has |a>a| to go on
+            self._dependencies[a][a] = row[a] / (row[a] + 1)
+
+    def init_dependency_graph(self):
+        n = len(self._labels)
+        if np is not None and n > 0:
+            dependencies = self._dependencies
+            best = dependencies.max(axis=1)
+            arcs = (np.asarray(self._matrix) >= self._positive_observations) & (dependencies >= self._dependency_threshold) & (best[:, None] - dependencies <= self._relative_to_best)
+            for a, b in zip(*np.nonzero(arcs)):
+                self._outputs[a].add(int(b))
+                self._inputs[b].add(int(a))
+        else:
+            for a in range(n):
+                row = self._dependencies[a]
+                best = max(row, default=0)
+                for b in range(n):
+                    if self._matrix[a][b] >= self._positive_observations and row[b] >= self._dependency_threshold and best - row[b] <= self._relative_to_best:
+                        self._outputs[a].add(b)
+                        self._inputs[b].add(a)
+
+        # traces start at activities without a cause and end at activities without a successor
+        self._start_activities = self._boundary(self._starts, self._inputs)
+        self._end_activities = self._boundary(self._ends, self._outputs)
+
+        # every activity keeps its best cause and its best successor
+        for a in range(n):
+            if a not in self._start_activities and not self._inputs[a] - {a}:
+                b = max((b for b in range(n) if b != a), key=lambda b: self._dependencies[b][a], default=None)
+                if b is not None:
+                    self._outputs[b].add(a)
+                    self._inputs[a].add(b)
+
+            if a not in self._end_activities and not self._outputs[a] - {a}:
+                b = max((b for b in range(n) if b != a), key=lambda b: self._dependencies[a][b], default=None)
+                if b is not None:
+                    self._outputs[a].add(b)
+                    self._inputs[b].add(a)
+
+    def init_splits_and_joins(self):
+        matrix = self._matrix
+        for a in range(len(self._labels)):
+            # b and c after a are parallel when (|b>c| + |c>b|) / (|a>b| + |a>c| + 1) reaches the AND threshold
+            outputs = sorted(self._outputs[a])
+            self._output_groups.append(self._xor_groups(outputs, a, self._and_measures(outputs, [matrix[a][b] for b in outputs])))
+            # and b and c before a when (|b>c| + |c>b|) / (|b>a| + |c>a| + 1) does
+            inputs = sorted(self._inputs[a])
+            self._input_groups.append(self._xor_groups(inputs, a, self._and_measures(inputs, [matrix[b][a] for b in inputs])))
+
+    def init_places(self):
+        n = len(self._labels)
+        if n <= 0:
+            return
+
+        # transitions get dense negative ids in alphabet order, like alpha
+        order = sorted(range(n), key=lambda a: self._labels[a])
+        transitions = [None] * n
+        for i, a in enumerate(order):
+            transitions[a] = Transition(self._labels[a], -(i + 1))
+        self.T_W = set(transitions)
+
+        # arcs sharing a XOR split or a XOR join end up in the same place
+        # length-one loops stay in the dependency graph but get no place, like in alpha
+        arcs = [(a, b) for a in range(n) for b in sorted(self._outputs[a]) if a != b]
+        parent = list(range(len(arcs)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        arc_index = {arc: i for i, arc in enumerate(arcs)}
+        for a in range(n):
+            for group in self._output_groups[a]:
+                members = [arc_index[a, b] for b in group if b != a]
+                for i in members[1:]:
+                    parent[find(i)] = find(members[0])
+
+            for group in self._input_groups[a]:
+                members = [arc_index[b, a] for b in group if b != a]
+                for i in members[1:]:
+                    parent[find(i)] = find(members[0])
+
+        places = dict()
+        for i, (a, b) in enumerate(arcs):
+            A, B = places.setdefault(find(i), (set(), set()))
+            A.add(transitions[a])
+            B.add(transitions[b])
+
+        self.P_W.add(Place(0, 0, None, set(transitions[a] for a in self._start_activities)))
+        i = 1
+        for A, B in sorted(places.values(), key=lambda place: (self._names(place[0]), self._names(place[1]))):
+            self.P_W.add(Place(i, 0, A, B))
+            i += 1
+        self.P_W.add(Place(i, 0, set(transitions[a] for a in self._end_activities), None))
+
+    def init_flow_relations(self):
+        for place in self.P_W:
+            A = place.get_A()
+            B = place.get_B()
+
+            for transition in A:
+                self.F_W.add(Edge(transition.get_id(), place.get_id()))
+
+            for transition in B:
+                self.F_W.add(Edge(place.get_id(), transition.get_id()))
+
+    def build_petri_net(self):
+        self._petri_net = PetriNet(self.P_W, self.T_W, self.F_W)
+
+    def get_petri_net(self):
+        return self._petri_net
+
+    def get_dependency_measures(self):
+        return {self._labels[a]: {self._labels[b]: float(measure) for b, measure in enumerate(row)} for a, row in enumerate(self._dependencies)}
+
+    def get_dependency_graph(self):
+        return {self._labels[a]: sorted(self._labels[b] for b in outputs) for a, outputs in enumerate(self._outputs)}
+
+    def _boundary(self, counts, neighbours):
+        activities = set(a for a, count in enumerate(counts) if count >= self._positive_observations and not neighbours[a] - {a})
+        if not activities and any(counts):
+            activities.add(max(range(len(counts)), key=counts.__getitem__))
+
+        return activities
+
+    def _and_measures(self, neighbours, counts):
+        # (|b>c| + |c>b|) / (counts[b] + counts[c] + 1) for every pair of neighbours, by position
+        if np is not None:
+            index = np.asarray(neighbours, dtype=np.intp)
+            together = np.asarray(self._matrix)[np.ix_(index, index)]
+            counts = np.asarray(counts, dtype=np.float64)
+            return (together + together.T) / (counts[:, None] + counts[None, :] + 1)
+
+        matrix = self._matrix
+        return [[(matrix[b][c] + matrix[c][b]) / (counts[i] + counts[j] + 1) for j, c in enumerate(neighbours)] for i, b in enumerate(neighbours)]
+
+    def _xor_groups(self, neighbours, a, measures):
+        groups = []
+        for i, b in enumerate(neighbours):
+            for group in groups:
+                if all(b == a or neighbours[j] == a or measures[i][j] < self._and_threshold for j in group):
+                    group.append(i)
+                    break
+            else:
+                groups.append([i])
+
+        return [[neighbours[i] for i in group] for group in groups]
+
+    def _names(self, transitions):
+        return sorted(transition.get_name() for transition in transitions)
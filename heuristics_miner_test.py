@@ -0,0 +1,9 @@
+from conformance import fitness_token_replay, read_from_file
+from heuristics_miner import heuristics
+
+log = read_from_file("extension-log.xes")
+log_noisy = read_from_file("extension-log-noisy.xes")
+
+for mined_model in [heuristics(log), heuristics(log_noisy)]:
+    print(round(fitness_token_replay(log, mined_model), 5))
+    print(round(fitness_token_replay(log_noisy, mined_model), 5))
@@ -1,3 +1,15 @@
+from array import array
+from collections import Counter
+from itertools import accumulate, repeat
+from operator import add, mul
+
+# NumPy is optional: with it directly_follows_matrix returns an n x n int64 ndarray,
+# without it a list of array('q') rows, and both are read as matrix[a][b]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 def log_as_dictionary(f):
     log = dict()
     for line in f.split('\n'):
@@ -32,6 +44,44 @@ def dependency_graph(log):
 
     return dg
 
+def dependency_matrix(log):
+    codes, offsets, labels = encode_log(log)
+    return directly_follows_matrix(codes, offsets, len(labels)), labels
+
+def directly_follows_matrix(codes, offsets, n):
+    if np is not None:
+        codes = np.asarray(codes, dtype=np.int64)
+        keys = codes[:-1] * n + codes[1:]
+        # the pairs across a case boundary are not directly-follows pairs
+        boundaries = np.asarray(offsets, dtype=np.int64)[1:-1]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[boundaries[(boundaries > 0) & (boundaries < len(codes))] - 1] = False
+        return np.bincount(keys[keep], minlength=n * n).astype(np.int64).reshape(n, n)
+
+    # every pair of neighbouring codes is counted under the key prev * n + next
+    counts = Counter(map(add, map(mul, codes, repeat(n)), codes[1:]))
+    # the pairs across a case boundary are not directly-follows pairs
+    for boundary in set(offsets[1:-1]):
+        if 0 < boundary < len(codes):
+            counts[codes[boundary - 1] * n + codes[boundary]] -= 1
+
+    matrix = [array('q', bytes(8 * n)) for _ in range(n)]
+    for key, count in counts.items():
+        matrix[key // n][key % n] = count
+
+    return matrix
+
+def encode_log(log):
+    tasks = [event.get_task() for events in log.values() for event in events]
+    labels = list(dict.fromkeys(tasks))
+    index = {task: i for i, task in enumerate(labels)}
+
+    codes = array('i', map(index.__getitem__, tasks))
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, log.values())))
+
+    return codes, offsets, labels
+
 class Event:
     def __init__(self, task, case, user, date):
         self._task = task
@@ -1,43 +1,212 @@
 import xml.etree.ElementTree as ET
-from datetime import datetime
+import json
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from datetime import datetime, timedelta
+from array import array
+from collections import Counter
+from itertools import accumulate, repeat
+from operator import add, mul
 
-def read_from_file(path):
-    tree = ET.parse(path)
-    root = tree.getroot()
+# NumPy is optional: with it directly_follows_matrix returns an n x n int64 ndarray,
+# without it a list of array('q') rows, and both are read as matrix[a][b]
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
+def read_from_file(path, workers=1):
     cases = dict()
 
-    for trace in root:
-        if not trace.tag.endswith('trace'):
-            continue
-
-        case = None
-        for event in trace:
-            if event.tag.endswith('string'):
-                case = event.get('value')
-                if case not in cases.keys():
-                    cases[case] = []
-                continue
-
-            event_wrapper = Event(case)
-
-            for child in event:
-                if child.get('key') == "concept:name":
-                    event_wrapper.set_name(child.get('value'))
-                elif child.tag.endswith('date'):
-                    time = datetime.fromisoformat(child.get('value'))
-                    time = time.replace(tzinfo=None)
-                    event_wrapper.set_time(time)
-                elif child.tag.endswith('int'):
-                    event_wrapper.set_cost(int(child.get('value')))
-                else:
-                    event_wrapper.add_resource(child.get('value'))
+    # more workers than cores only adds process overhead to the same parse
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1:
+        # workers send back compact columnar chunks, the events are only built here
+        traces = (trace for chunk in _map_chunks(_read_columnar_chunk, path, workers) for trace in chunk.traces())
+    else:
+        traces = stream_from_file(path)
 
-            cases[case].append(event_wrapper)
+    for case, events in traces:
+        if case not in cases.keys():
+            cases[case] = []
+        cases[case].extend(events)
 
     return cases
 
+def read_columnar(path, workers=1):
+    log = ColumnarLog()
+
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1:
+        for chunk in _map_chunks(_read_columnar_chunk, path, workers):
+            log.extend(chunk)
+        return log
+
+    for case, events in stream_from_file(path):
+        log.add_trace(case, events)
+
+    return log
+
+def split_traces(path, n):
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with data:
+        first = TRACE_START.search(data)
+        if first is None:
+            return []
+
+        # the last closing tag has to be the root's, anything else is left to the serial reader
+        end = data.rfind(b'</')
+        if end < first.start() or LOG_END.match(data, end) is None:
+            return []
+
+        # move every evenly spaced cut forward to the next trace start tag
+        bounds = [first.start()]
+        for k in range(1, n):
+            match = TRACE_START.search(data, first.start() + k * (end - first.start()) // n, end)
+            if match is not None and match.start() > bounds[-1]:
+                bounds.append(match.start())
+        bounds.append(end)
+
+    return list(zip(bounds, bounds[1:]))
+
+def _map_chunks(read_chunk, path, workers):
+    chunks = split_traces(path, 4 * workers)
+    if len(chunks) <= 1:
+        return [read_chunk(path)]
+
+    starts, ends = zip(*chunks)
+    with ProcessPoolExecutor(workers) as executor:
+        # map keeps the chunks in file order, so cases come out in the same order as a serial read
+        return list(executor.map(_read_chunk_traces, repeat(read_chunk), repeat(path), starts, ends, repeat(starts[0]), repeat(ends[-1])))
+
+def _read_chunk_traces(read_chunk, path, start, end, prolog_end, epilog_start):
+    # every chunk keeps the original declaration, root tag and log attributes, so its encoding,
+    # namespaces and log level elements parse exactly like in the whole file
+    with open(path, 'rb') as f:
+        prolog = f.read(prolog_end)
+        f.seek(start)
+        data = f.read(end - start)
+        f.seek(epilog_start)
+        epilog = f.read()
+
+    return read_chunk(BytesIO(prolog + data + epilog))
+
+def _read_columnar_chunk(source):
+    log = ColumnarLog()
+    for case, events in stream_from_file(source):
+        log.add_trace(case, events)
+
+    return log
+
+def read_cached(path, cache_path=None):
+    cache_path = path + '.cache' if cache_path is None else cache_path
+    key = cache_key(path)
+
+    log = read_cache(cache_path, key)
+    if log is None:
+        log = read_columnar(path)
+        try:
+            write_cache(log, cache_path, key)
+        except OSError:
+            # an unwritable cache location only means the next read parses again
+            pass
+
+    return log
+
+def cache_key(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+def read_cache(cache_path, key):
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < 16:
+                return None
+            # the mapping outlives the file object, pages are shared by every process that maps the file
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[:8] != CACHE_MAGIC:
+            return None
+
+        header_end = 16 + int.from_bytes(buffer[8:16], 'little')
+        header = json.loads(buffer[16:header_end].decode('utf-8'))
+        if header['key'] != key:
+            return None
+
+        return ColumnarLog.from_buffer(buffer, _align(header_end), header)
+    except (OSError, ValueError, KeyError, TypeError):
+        # a truncated or corrupt cache is rebuilt like a missing one
+        return None
+
+def write_cache(log, cache_path, key):
+    header, columns = log.to_columns()
+    header['key'] = key
+    header = json.dumps(header).encode('utf-8')
+
+    # write next to the target and rename, so readers never map a half written file
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            f.write(bytes(_align(16 + len(header)) - 16 - len(header)))
+            for column in columns:
+                data = column.tobytes()
+                f.write(data)
+                f.write(bytes(_align(len(data)) - len(data)))
+
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+def stream_from_file(path):
+    reader = TraceReader()
+    parser = ET.XMLParser(target=reader)
+
+    # the parser calls back into the reader for every tag, so no element tree is ever built
+    f = path if hasattr(path, 'read') else open(path, 'rb')
+    try:
+        chunk = f.read(CHUNK_SIZE)
+        while chunk:
+            parser.feed(chunk)
+            yield from reader.pop_traces()
+            chunk = f.read(CHUNK_SIZE)
+
+        parser.close()
+        yield from reader.pop_traces()
+    finally:
+        if f is not path:
+            f.close()
+
 def dependency_graph(log):
+    # columnar logs already hold their activity codes, a dict log is cheaper to count in one pass
+    if isinstance(log, ColumnarLog):
+        matrix, labels = dependency_matrix(log)
+
+        dg = dict()
+        for i, task in enumerate(labels):
+            dg[task] = dict()
+            for j, count in enumerate(matrix[i].tolist()):
+                if count > 0:
+                    dg[task][labels[j]] = count
+
+        return dg
+
     dg = dict()
     for _, events in log.items():
         prev_task = None
@@ -56,9 +225,54 @@ def dependency_graph(log):
 
     return dg
 
+def dependency_matrix(log):
+    codes, offsets, labels = encode_log(log)
+    return directly_follows_matrix(codes, offsets, len(labels)), labels
+
+def directly_follows_matrix(codes, offsets, n):
+    if np is not None:
+        codes = np.asarray(codes, dtype=np.int64)
+        keys = codes[:-1] * n + codes[1:]
+        # the pairs across a case boundary are not directly-follows pairs
+        boundaries = np.asarray(offsets, dtype=np.int64)[1:-1]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[boundaries[(boundaries > 0) & (boundaries < len(codes))] - 1] = False
+        return np.bincount(keys[keep], minlength=n * n).astype(np.int64).reshape(n, n)
+
+    # every pair of neighbouring codes is counted under the key prev * n + next
+    counts = Counter(map(add, map(mul, codes, repeat(n)), codes[1:]))
+    # the pairs across a case boundary are not directly-follows pairs
+    for boundary in set(offsets[1:-1]):
+        if 0 < boundary < len(codes):
+            counts[codes[boundary - 1] * n + codes[boundary]] -= 1
+
+    matrix = [array('q', bytes(8 * n)) for _ in range(n)]
+    for key, count in counts.items():
+        matrix[key // n][key % n] = count
+
+    return matrix
+
+def encode_log(log):
+    # columnar logs already hold their activity codes
+    if isinstance(log, ColumnarLog):
+        return log.encode()
+
+    tasks = [event.get_task() for events in log.values() for event in events]
+    labels = list(dict.fromkeys(tasks))
+    index = {task: i for i, task in enumerate(labels)}
+
+    codes = array('i', map(index.__getitem__, tasks))
+    offsets = array('q', [0])
+    offsets.extend(accumulate(map(len, log.values())))
+
+    return codes, offsets, labels
+
 class Event:
     def __init__(self, case):
         self._case = case
+        self._name = None
+        self._timestamp = MISSING
+        self._cost = None
         self._resources = []
 
     def set_name(self, name):
@@ -68,7 +282,10 @@ class Event:
         self._resources.append(resource)
 
     def set_time(self, time):
-        self._time = time
+        self._timestamp = to_epoch(time)
+
+    def set_timestamp(self, timestamp):
+        self._timestamp = timestamp
     
     def set_cost(self, cost):
         self._cost = cost
@@ -76,12 +293,450 @@ class Event:
     def get_task(self):
         return self._name
 
+    def get_time(self):
+        return from_epoch(self._timestamp)
+
+    def get_timestamp(self):
+        return self._timestamp
+
+    def get_cost(self):
+        return self._cost
+
+    def get_resources(self):
+        return self._resources
+
     def __getitem__(self, key):
         if key == 'concept:name':
             return self._name
         elif key == 'time:timestamp':
-            return self._time
+            return self.get_time()
         elif key == 'cost':
             return self._cost
         else:
             return self._resources[0]
+
+CHUNK_SIZE = 1 << 16
+TRACE_START = re.compile(rb'<(?:[\w.-]+:)?trace[\s/>]')
+LOG_END = re.compile(rb'</(?:[\w.-]+:)?log\s*>')
+CACHE_MAGIC = b'XESCOLS1'
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MISSING = -2**63
+
+TRACE = 0
+STRING = 1
+DATE = 2
+INT = 3
+OTHER = 4
+TAG_KINDS = dict()
+DAYS = dict()
+OFFSETS = set()
+OFFSET = re.compile(r'(Z|[+-]\d\d(:?\d\d)?)?$')
+
+class TraceReader():
+    def __init__(self):
+        self._traces = []
+        self._depth = 0
+        self._trace_depth = None
+        self._case = None
+        self._events = None
+        self._event = None
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        kind = TAG_KINDS.get(tag)
+        if kind is None:
+            kind = tag_kind(tag)
+
+        if self._trace_depth is None:
+            if kind == TRACE:
+                self._trace_depth = self._depth
+                self._case = None
+                self._events = []
+            return
+
+        level = self._depth - self._trace_depth
+        if level == 1:
+            if kind == STRING:
+                self._case = attrib.get('value')
+            else:
+                self._event = Event(self._case)
+                self._events.append(self._event)
+        elif level == 2 and self._event is not None:
+            value = attrib.get('value')
+            if attrib.get('key') == "concept:name":
+                self._event.set_name(intern(value))
+            elif kind == DATE:
+                self._event.set_timestamp(parse_timestamp(value))
+            elif kind == INT:
+                self._event.set_cost(int(value))
+            else:
+                self._event.add_resource(intern(value))
+
+    def end(self, tag):
+        if self._trace_depth is not None:
+            level = self._depth - self._trace_depth
+            if level == 0:
+                self._traces.append((self._case, self._events))
+                self._trace_depth = None
+                self._events = None
+            elif level == 1:
+                self._event = None
+
+        self._depth -= 1
+
+    def pop_traces(self):
+        traces = self._traces
+        self._traces = []
+        return traces
+
+    def close(self):
+        return None
+
+class ColumnarLog():
+    COLUMNS = [
+        ('_activity_codes', 'i'),
+        ('_timestamps', 'q'),
+        ('_costs', 'q'),
+        ('_attribute_offsets', 'q'),
+        ('_attribute_codes', 'i'),
+        ('_offsets', 'q'),
+        ('_trace_cases', 'i'),
+    ]
+
+    def __init__(self):
+        self._activities = StringTable()
+        self._attributes = StringTable()
+        self._case_ids = StringTable()
+
+        # one entry per event
+        self._activity_codes = array('i')
+        self._timestamps = array('q')
+        self._costs = array('q')
+        self._attribute_offsets = array('q', [0])
+        self._attribute_codes = array('i')
+
+        # one entry per trace, a case read from several traces keeps all of them
+        self._offsets = array('q', [0])
+        self._trace_cases = array('i')
+        self._case_traces = []
+
+    def add_trace(self, case, events):
+        for event in events:
+            self._activity_codes.append(self._activities.encode(event.get_task()))
+            self._timestamps.append(event.get_timestamp())
+            self._costs.append(MISSING if event.get_cost() is None else event.get_cost())
+            self._attribute_codes.extend([self._attributes.encode(value) for value in event.get_resources()])
+            self._attribute_offsets.append(len(self._attribute_codes))
+
+        case_traces = self._get_case_traces()
+        case_code = self._case_ids.encode(case)
+        if case_code == len(case_traces):
+            case_traces.append([])
+
+        case_traces[case_code].append(len(self._trace_cases))
+        self._trace_cases.append(case_code)
+        self._offsets.append(len(self._activity_codes))
+
+    def extend(self, other):
+        activities = [self._activities.encode(value) for value in other._activities.get_values()]
+        attributes = [self._attributes.encode(value) for value in other._attributes.get_values()]
+        event_base = len(self._activity_codes)
+        attribute_base = len(self._attribute_codes)
+
+        self._activity_codes.extend(map(activities.__getitem__, other._activity_codes))
+        self._timestamps.extend(other._timestamps)
+        self._costs.extend(other._costs)
+        self._attribute_codes.extend(map(attributes.__getitem__, other._attribute_codes))
+        self._attribute_offsets.extend(map(add, other._attribute_offsets[1:], repeat(attribute_base)))
+
+        case_traces = self._get_case_traces()
+        for trace, case_code in enumerate(other._trace_cases):
+            case_code = self._case_ids.encode(other._case_ids.decode(case_code))
+            if case_code == len(case_traces):
+                case_traces.append([])
+
+            case_traces[case_code].append(len(self._trace_cases))
+            self._trace_cases.append(case_code)
+            self._offsets.append(event_base + other._offsets[trace + 1])
+
+    def traces(self):
+        activities = self._activities.get_values()
+        attributes = self._attributes.get_values()
+        case_ids = self._case_ids.get_values()
+        attribute_offsets = self._attribute_offsets
+
+        for trace, case_code in enumerate(self._trace_cases):
+            case = case_ids[case_code]
+            events = []
+            for i in range(self._offsets[trace], self._offsets[trace + 1]):
+                event = Event(case)
+                event.set_name(activities[self._activity_codes[i]])
+                event.set_timestamp(self._timestamps[i])
+                if self._costs[i] != MISSING:
+                    event.set_cost(self._costs[i])
+                for code in self._attribute_codes[attribute_offsets[i]:attribute_offsets[i + 1]]:
+                    event.add_resource(attributes[code])
+                events.append(event)
+
+            yield case, events
+
+    @classmethod
+    def from_buffer(cls, buffer, start, header):
+        log = cls()
+        log._activities = StringTable(header['activities'])
+        log._attributes = StringTable(header['attributes'])
+        log._case_ids = StringTable(header['case_ids'])
+        log._case_traces = None
+
+        view = memoryview(buffer)
+        for (name, typecode), (offset, length) in zip(cls.COLUMNS, header['columns']):
+            size = length * array(typecode).itemsize
+            if start + offset + size > len(buffer):
+                raise ValueError('column %s runs past the end of the buffer' % name)
+            setattr(log, name, view[start + offset:start + offset + size].cast(typecode))
+
+        return log
+
+    def to_columns(self):
+        columns = [getattr(self, name) for name, _ in self.COLUMNS]
+        layout = []
+        offset = 0
+        for column in columns:
+            layout.append([offset, len(column)])
+            offset += _align(len(column) * column.itemsize)
+
+        header = {
+            'activities': self._activities.get_values(),
+            'attributes': self._attributes.get_values(),
+            'case_ids': self._case_ids.get_values(),
+            'columns': layout,
+        }
+        return header, columns
+
+    def encode(self):
+        if len(self._case_ids) == len(self._trace_cases):
+            return self._activity_codes, self._offsets, self._activities.get_values()
+
+        codes = array('i')
+        offsets = array('q', [0])
+        for traces in self._get_case_traces():
+            for trace in traces:
+                codes.extend(self._activity_codes[self._offsets[trace]:self._offsets[trace + 1]])
+            offsets.append(len(codes))
+
+        return codes, offsets, self._activities.get_values()
+
+    def get_activity(self, i):
+        return self._activities.decode(self._activity_codes[i])
+
+    def get_time(self, i):
+        return from_epoch(self._timestamps[i])
+
+    def get_cost(self, i):
+        return None if self._costs[i] == MISSING else self._costs[i]
+
+    def get_resources(self, i):
+        codes = self._attribute_codes[self._attribute_offsets[i]:self._attribute_offsets[i + 1]]
+        return [self._attributes.decode(code) for code in codes]
+
+    def keys(self):
+        return list(self._case_ids.get_values())
+
+    def values(self):
+        return (self[case] for case in self._case_ids.get_values())
+
+    def items(self):
+        return ((case, self[case]) for case in self._case_ids.get_values())
+
+    def __getitem__(self, case):
+        positions = []
+        for trace in self._get_case_traces()[self._case_ids.lookup(case)]:
+            positions.append(range(self._offsets[trace], self._offsets[trace + 1]))
+
+        return CaseView(self, positions[0] if len(positions) == 1 else [i for r in positions for i in r])
+
+    def __contains__(self, case):
+        return self._case_ids.contains(case)
+
+    def __iter__(self):
+        return iter(self._case_ids.get_values())
+
+    def __len__(self):
+        return len(self._case_ids)
+
+    def _get_case_traces(self):
+        # logs loaded from a cache only build the case to trace lookup when it is needed
+        if self._case_traces is None:
+            self._case_traces = [[] for _ in range(len(self._case_ids))]
+            for trace, case_code in enumerate(self._trace_cases):
+                self._case_traces[case_code].append(trace)
+
+        return self._case_traces
+
+    def __getstate__(self):
+        # derived lookups are rebuilt on demand instead of being pickled between processes
+        state = dict(self.__dict__)
+        state['_case_traces'] = None
+        return state
+
+class CaseView():
+    def __init__(self, log, positions):
+        self._log = log
+        self._positions = positions
+
+    def __getitem__(self, i):
+        return EventView(self._log, self._positions[i])
+
+    def __iter__(self):
+        return (EventView(self._log, i) for i in self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+class EventView():
+    def __init__(self, log, i):
+        self._log = log
+        self._i = i
+
+    def get_task(self):
+        return self._log.get_activity(self._i)
+
+    def get_time(self):
+        return self._log.get_time(self._i)
+
+    def get_cost(self):
+        return self._log.get_cost(self._i)
+
+    def get_resources(self):
+        return self._log.get_resources(self._i)
+
+    def __getitem__(self, key):
+        if key == 'concept:name':
+            return self.get_task()
+        elif key == 'time:timestamp':
+            return self.get_time()
+        elif key == 'cost':
+            return self.get_cost()
+        else:
+            return self.get_resources()[0]
+
+    def __hash__(self):
+        return hash(self.get_task())
+
+    def __eq__(self, other):
+        if isinstance(other, EventView):
+            return self.get_task() == other.get_task()
+
+class StringTable():
+    def __init__(self, values=None):
+        self._values = [] if values is None else list(values)
+        self._index = None
+
+    def encode(self, value):
+        index = self._get_index()
+        code = index.get(value)
+        if code is None:
+            code = len(self._values)
+            index[value] = code
+            self._values.append(value)
+
+        return code
+
+    def decode(self, code):
+        return self._values[code]
+
+    def lookup(self, value):
+        return self._get_index()[value]
+
+    def contains(self, value):
+        return value in self._get_index()
+
+    def get_values(self):
+        return self._values
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = {value: i for i, value in enumerate(self._values)}
+
+        return self._index
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_index'] = None
+        return state
+
+    def __len__(self):
+        return len(self._values)
+
+def intern(value):
+    return value if value is None else sys.intern(value)
+
+def tag_kind(tag):
+    kind = TAG_KINDS.get(tag)
+    if kind is None:
+        if tag.endswith('trace'):
+            kind = TRACE
+        elif tag.endswith('string'):
+            kind = STRING
+        elif tag.endswith('date'):
+            kind = DATE
+        elif tag.endswith('int'):
+            kind = INT
+        else:
+            kind = OTHER
+        TAG_KINDS[tag] = kind
+
+    return kind
+
+def parse_timestamp(value):
+    # like datetime.fromisoformat(value).replace(tzinfo=None): the wall clock time is kept and the offset dropped
+    try:
+        day = DAYS.get(value[:10])
+        if day is None:
+            day = to_epoch(datetime.fromisoformat(value[:10]))
+            DAYS[value[:10]] = day
+
+        if len(value) < 19 or value[10] not in 'T ' or value[13] != ':' or value[16] != ':':
+            raise ValueError(value)
+
+        micros = 0
+        rest = value[19:]
+        if rest[:1] == '.':
+            digits = len(rest) - len(rest[1:].lstrip('0123456789')) - 1
+            if digits not in (3, 6):
+                raise ValueError(value)
+            micros = int(rest[1:digits + 1].ljust(6, '0'))
+            rest = rest[digits + 1:]
+
+        if rest not in OFFSETS:
+            if OFFSET.match(rest) is None:
+                raise ValueError(value)
+            if rest not in ('', 'Z') and (int(rest[1:3]) > 23 or int(rest[3:].lstrip(':') or 0) > 59):
+                raise ValueError(value)
+            OFFSETS.add(rest)
+
+        # anything fromisoformat would reject goes to the slow path, which raises
+        hours, minutes, seconds = value[11:13], value[14:16], value[17:19]
+        if not (hours.isdigit() and minutes.isdigit() and seconds.isdigit()):
+            raise ValueError(value)
+
+        hours, minutes, seconds = int(hours), int(minutes), int(seconds)
+        if hours > 23 or minutes > 59 or seconds > 59:
+            raise ValueError(value)
+
+        return day + (hours * 3600 + minutes * 60 + seconds) * 1000000 + micros
+    except (ValueError, IndexError):
+        return to_epoch(datetime.fromisoformat(value).replace(tzinfo=None))
+
+def to_epoch(time):
+    if time is None:
+        return MISSING
+
+    return (time - EPOCH) // MICROSECOND
+
+def from_epoch(value):
+    if value == MISSING:
+        return None
+
+    return EPOCH + value * MICROSECOND
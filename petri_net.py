@@ -3,17 +3,21 @@ class PetriNet():
         self._places = set()
         self._transitions = set()
         self._edges = set()
+        self._places_by_id = dict()
+        self._transitions_by_name = dict()
+        self._preset = dict()
+        self._postset = dict()
 
     def add_place(self, name):
-        self._places.add(Place(name))
+        self._index_place(Place(name))
         return self
 
     def add_transition(self, name, id):
-        self._transitions.add(Transition(name, id))
+        self._index_transition(Transition(name, id))
         return self
 
     def add_edge(self, source, target):
-        self._edges.add(Edge(source, target))
+        self._index_edge(Edge(source, target))
         return self
 
     def get_tokens(self, id):
@@ -29,9 +33,9 @@ class PetriNet():
         return True
 
     def add_marking(self, place_id):
-        for place in self._places:
-            if place.get_id() == place_id:
-                place.increment_tokens()
+        place = self._get_place_by_id(place_id)
+        if place is not None:
+            place.increment_tokens()
 
     def fire_transition(self, transition):
         if not self.is_enabled(transition):
@@ -47,30 +51,44 @@ class PetriNet():
             place.increment_tokens()
 
 
-    def _dot_t(self, t):
-        dot_t = set()
-        for edge in self._edges:
-            if edge.is_target(t):
-                place = self._get_place_by_id(edge.get_source())
-                dot_t.add(place)
+    def transition_name_to_id(self, name):
+        transition = self._transitions_by_name.get(name)
+        if transition is None:
+            return None
 
-        return dot_t
+        return transition.get_id()
 
-    def _t_dot(self, t):
-        t_dot = set()
-        for edge in self._edges:
-            if edge.is_source(t):
-                place = self._get_place_by_id(edge.get_target())
-                t_dot.add(place)
+    def _dot_t(self, t):
+        return set(self._get_place_by_id(id) for id in self._preset.get(t, []))
 
-        return t_dot
+    def _t_dot(self, t):
+        return set(self._get_place_by_id(id) for id in self._postset.get(t, []))
 
     def _get_place_by_id(self, id):
-        for place in self._places:
-            if place.get_id() == id:
-                return place
+        return self._places_by_id.get(id)
 
-        return None
+    def _index_place(self, place):
+        if place.get_id() in self._places_by_id:
+            return
+
+        self._places.add(place)
+        self._places_by_id[place.get_id()] = place
+
+    def _index_transition(self, transition):
+        if transition in self._transitions:
+            return
+
+        self._transitions.add(transition)
+        if transition.get_name() not in self._transitions_by_name:
+            self._transitions_by_name[transition.get_name()] = transition
+
+    def _index_edge(self, edge):
+        if edge in self._edges:
+            return
+
+        self._edges.add(edge)
+        self._postset.setdefault(edge.get_source(), []).append(edge.get_target())
+        self._preset.setdefault(edge.get_target(), []).append(edge.get_source())
 
 class Place():
     def __init__(self, id, num_of_tokens=0):
@@ -107,6 +125,12 @@ class Transition():
         self._name = name
         self._id = id
 
+    def get_id(self):
+        return self._id
+
+    def get_name(self):
+        return self._name
+
     def __hash__(self):
         return hash(self._id)
 
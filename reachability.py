@@ -0,0 +1,215 @@
+import os
+import sys
+import tempfile
+from array import array
+from collections import deque
+
+from conformance import PetriNet, alpha, read_from_file
+
+# the largest int32, so a transition consuming from an ω place is always enabled
+OMEGA = 2**31 - 1
+# rough per state cost of the intern table entry, the id list slot and the parent slot
+STATE_OVERHEAD = 120
+
+def explore(model, max_states=1000000, max_memory=None, coverability=True, depth_first=False, spill_dir=None, spill_size=100000):
+    explorer = ReachabilityExplorer(model, max_states, max_memory, coverability)
+    return explorer.explore(depth_first, spill_dir, spill_size)
+
+class ReachabilityExplorer():
+    def __init__(self, model, max_states=1000000, max_memory=None, coverability=True):
+        place_index = model.get_place_index()
+        self._net = model.compile()
+        self._max_states = max_states
+        self._max_memory = max_memory
+        self._coverability = coverability
+        self._place_ids = [None] * len(place_index)
+        for id, i in place_index.items():
+            self._place_ids[i] = id
+        self._names = self._net.get_labels()
+
+        initial = array('i', bytes(4 * len(place_index)))
+        for id, i in place_index.items():
+            initial[i] = model.get_tokens(id)
+        if not any(initial) and place_index.get(0) is not None:
+            initial[place_index[0]] = 1
+        self._initial = initial
+
+        self._final = set(array('i', marking).tobytes() for marking in self._net.final_markings())
+
+        # interned markings: bytes -> state id, and state id -> the same bytes object
+        self._ids = dict()
+        self._markings = []
+        self._parents = array('q')
+        self._memory = 0
+
+    def explore(self, depth_first=False, spill_dir=None, spill_size=100000):
+        frontier = Frontier(depth_first, spill_dir, spill_size)
+        fired = set()
+        unbounded = set()
+        deadlocks = []
+        edges = 0
+        complete = True
+
+        try:
+            frontier.push(self._intern(self._initial.tobytes(), -1))
+            while len(frontier) > 0:
+                state = frontier.pop()
+                marking = array('i', self._markings[state])
+                enabled = [t for t in range(len(self._names)) if self._net.enabled(marking, t)]
+
+                if not enabled and self._markings[state] not in self._final:
+                    deadlocks.append(self._as_dict(marking))
+
+                for t in enabled:
+                    successor = self._fire(marking, t)
+                    if self._coverability:
+                        self._accelerate(successor, state)
+
+                    key = successor.tobytes()
+                    edges += 1
+                    fired.add(t)
+                    if key in self._ids:
+                        continue
+
+                    if len(self._markings) >= self._max_states or (self._max_memory is not None and self._memory >= self._max_memory):
+                        complete = False
+                        continue
+
+                    for i, tokens in enumerate(successor):
+                        if tokens == OMEGA:
+                            unbounded.add(self._place_ids[i])
+
+                    frontier.push(self._intern(key, state))
+        finally:
+            frontier.close()
+
+        dead = [self._names[t] for t in range(len(self._names)) if t not in fired]
+        return ReachabilityReport(len(self._markings), edges, complete, dead, sorted(unbounded), deadlocks)
+
+    def _intern(self, key, parent):
+        state = len(self._markings)
+        self._ids[key] = state
+        self._markings.append(key)
+        self._parents.append(parent)
+        self._memory += sys.getsizeof(key) + STATE_OVERHEAD
+        return state
+
+    def _accelerate(self, marking, state):
+        # Karp-Miller: a marking strictly covering an ancestor can repeat the same growth forever
+        while state >= 0:
+            ancestor = array('i', self._markings[state])
+            if ancestor != marking and all(m == OMEGA or (a != OMEGA and m >= a) for m, a in zip(marking, ancestor)):
+                for i, a in enumerate(ancestor):
+                    if marking[i] != OMEGA and marking[i] > a:
+                        marking[i] = OMEGA
+
+            state = self._parents[state]
+
+    def _fire(self, marking, t):
+        # an ω place stays ω whatever the transition consumes or produces
+        successor = list(self._net.fire(marking, t))
+        for i, tokens in enumerate(marking):
+            if tokens == OMEGA:
+                successor[i] = OMEGA
+
+        return array('i', successor)
+
+    def _as_dict(self, marking):
+        return {self._place_ids[i]: (float('inf') if tokens == OMEGA else tokens) for i, tokens in enumerate(marking) if tokens != 0}
+
+class Frontier():
+    def __init__(self, depth_first=False, spill_dir=None, spill_size=100000):
+        self._depth_first = depth_first
+        self._spill_dir = spill_dir
+        self._spill_size = spill_size
+        self._head = deque()
+        self._tail = array('q')
+        # spilled chunks of state ids as (offset, count) in the spill file
+        self._chunks = deque()
+        self._file = None
+        self._size = 0
+
+    def push(self, state):
+        self._tail.append(state)
+        self._size += 1
+        if self._spill_dir is not None and len(self._tail) >= self._spill_size:
+            self._spill()
+
+    def pop(self):
+        if self._depth_first:
+            if not self._tail:
+                self._tail = self._load(self._chunks.pop())
+        elif not self._head:
+            if self._chunks:
+                self._head.extend(self._load(self._chunks.popleft()))
+            else:
+                self._head.extend(self._tail)
+                self._tail = array('q')
+
+        self._size -= 1
+        if self._depth_first:
+            return self._tail.pop()
+        return self._head.popleft()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _spill(self):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self._spill_dir)
+
+        self._file.seek(0, os.SEEK_END)
+        self._chunks.append((self._file.tell(), len(self._tail)))
+        self._file.write(self._tail.tobytes())
+        self._tail = array('q')
+
+    def _load(self, chunk):
+        offset, count = chunk
+        self._file.seek(offset)
+        states = array('q')
+        states.frombytes(self._file.read(8 * count))
+        return states
+
+    def __len__(self):
+        return self._size
+
+class ReachabilityReport():
+    def __init__(self, states, edges, complete, dead_transitions, unbounded_places, deadlocks):
+        self._states = states
+        self._edges = edges
+        self._complete = complete
+        self._dead_transitions = dead_transitions
+        self._unbounded_places = unbounded_places
+        self._deadlocks = deadlocks
+
+    def get_states(self):
+        return self._states
+
+    def get_edges(self):
+        return self._edges
+
+    def is_complete(self):
+        return self._complete
+
+    def get_dead_transitions(self):
+        return self._dead_transitions
+
+    def get_unbounded_places(self):
+        return self._unbounded_places
+
+    def get_deadlocks(self):
+        return self._deadlocks
+
+    def is_bounded(self):
+        return len(self._unbounded_places) == 0
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else "extension-log.xes"
+    model = PetriNet.load(path) if not path.endswith('.xes') else alpha(read_from_file(path))
+    report = explore(model)
+    print("states: %d, edges: %d, complete: %s" % (report.get_states(), report.get_edges(), report.is_complete()))
+    print("dead transitions:", report.get_dead_transitions())
+    print("unbounded places:", report.get_unbounded_places())
+    print("deadlocks:", report.get_deadlocks())
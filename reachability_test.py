@@ -0,0 +1,7 @@
+from conformance import read_from_file, alpha
+from reachability import explore
+
+for path in ["extension-log.xes", "extension-log-noisy.xes"]:
+    report = explore(alpha(read_from_file(path)))
+    print(report.get_states(), report.is_complete())
+    print(report.get_dead_transitions(), report.get_unbounded_places(), len(report.get_deadlocks()))
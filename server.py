@@ -0,0 +1,133 @@
+import asyncio
+import json
+import sys
+from collections import Counter, OrderedDict
+
+from conformance import StreamingConformance, PetriNet, alpha, read_from_file
+
+class IngestionServer():
+    def __init__(self, model, max_cases=100000, timeout=None, queue_size=10000):
+        self._conformance = StreamingConformance(model, max_cases, timeout)
+        self._max_cases = max_cases
+        self._queue_size = queue_size
+        self._queue = None
+        self._counts = Counter()
+        # case id -> last task, least recently seen first
+        self._last = OrderedDict()
+        self._activities = dict()
+        self._events = 0
+        self._errors = 0
+
+    def ingest(self, line):
+        c = line.split(';')
+        if len(c) <= 1:
+            return
+
+        task, case = c[0], c[1]
+        previous = self._last.pop(case, None)
+        if previous is not None:
+            self._counts[previous, task] += 1
+        elif len(self._last) >= self._max_cases:
+            self._last.popitem(last=False)
+
+        self._last[case] = task
+        self._activities[task] = None
+        self._conformance.observe(case, task)
+        self._events += 1
+
+    def close_case(self, case):
+        self._last.pop(case, None)
+        return self._conformance.close(case)
+
+    def get_dependency_graph(self):
+        # every activity seen gets an entry, like dependency_graph gives the last task of a case
+        dg = {task: dict() for task in self._activities}
+        for (a, b), count in self._counts.items():
+            dg[a][b] = count
+
+        return dg
+
+    def get_fitness(self):
+        return self._conformance.get_fitness()
+
+    def get_status(self):
+        return {
+            'fitness': self.get_fitness(),
+            'events': self._events,
+            'open_cases': self._conformance.get_open_cases(),
+            'closed_cases': self._conformance.get_closed_cases(),
+            'evicted_cases': self._conformance.get_evicted_cases(),
+            'errors': self._errors,
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def consume(self):
+        queue = self._queue
+        while True:
+            line = await queue.get()
+            # one bad line must not stop the consumer, or the queue fills up and every client blocks
+            try:
+                if line.startswith('!close '):
+                    self.close_case(line[7:])
+                else:
+                    self.ingest(line)
+            except Exception as e:
+                self._errors += 1
+                print("dropped %r: %r" % (line, e), file=sys.stderr)
+            finally:
+                queue.task_done()
+
+    async def handle(self, reader, writer):
+        try:
+            async for data in reader:
+                line = data.decode(errors='replace').strip()
+                if not line:
+                    continue
+
+                # queries are answered from the current state, events wait for room in the queue
+                if line.startswith('?'):
+                    writer.write((json.dumps(self.query(line[1:])) + '\n').encode())
+                    await writer.drain()
+                else:
+                    await self._queue.put(line)
+        finally:
+            writer.close()
+
+    def query(self, name):
+        if name == 'fitness':
+            return self.get_status()
+        if name == 'dfg':
+            return self.get_dependency_graph()
+
+        return {'error': 'unknown query ' + name}
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        self._queue = asyncio.Queue(self._queue_size)
+        consumer = asyncio.create_task(self.consume())
+
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            consumer.cancel()
+
+def load_model(path):
+    if path.endswith('.xes'):
+        return alpha(read_from_file(path))
+
+    return PetriNet.load(path)
+
+if __name__ == '__main__':
+    model = load_model(sys.argv[1] if len(sys.argv) > 1 else "extension-log.xes")
+    address = sys.argv[2] if len(sys.argv) > 2 else "8765"
+    server = IngestionServer(model)
+
+    if address.isdigit():
+        asyncio.run(server.serve(port=int(address)))
+    else:
+        asyncio.run(server.serve(path=address))
@@ -0,0 +1,25 @@
+from conformance import fitness_token_replay, read_from_file, alpha, StreamingConformance
+
+log = read_from_file("extension-log.xes")
+log_noisy = read_from_file("extension-log-noisy.xes")
+
+mined_model = alpha(log)
+
+# the same fitness as token replay, fed one event at a time
+for events in [log, log_noisy]:
+    stream = StreamingConformance(mined_model)
+    for case_id, trace in events.items():
+        for event in trace:
+            stream.observe(case_id, event.get_task())
+        stream.close(case_id)
+    print(round(stream.get_fitness(), 5), round(fitness_token_replay(events, mined_model), 5))
+
+# cases pushed out by max_cases never finished, so they are counted apart from the fitness
+stream = StreamingConformance(mined_model, max_cases=100)
+for case_id, trace in log_noisy.items():
+    for event in trace:
+        stream.observe(case_id, event.get_task())
+print(stream.get_fitness(), stream.get_open_cases(), stream.get_closed_cases(), stream.get_evicted_cases())
+for case_id in list(log_noisy.keys())[-100:]:
+    stream.close(case_id)
+print(round(stream.get_fitness(), 5), stream.get_open_cases(), stream.get_closed_cases(), stream.get_evicted_cases())
@@ -0,0 +1,19 @@
+from log import parse_timestamp
+
+# the fast path has to accept and reject exactly what datetime.fromisoformat does
+values = [
+    "2011-10-01T12:34:56",
+    "2011-10-01T12:34:56.123+01:00",
+    "2011-10-01 23:59:59Z",
+    "2011-10-01 12:34:5",
+    "2011-10-01T25:00:00+01:00",
+    "2011-10-01T1 :34:56",
+    "2011-10-01T12:60:00",
+    "2011-10-01T12:00:00+25:00",
+]
+
+for value in values:
+    try:
+        print((value, parse_timestamp(value)))
+    except ValueError:
+        print((value, "ValueError"))